@@ -0,0 +1,5 @@
+"""Benchmarks for the QuantumultX script converter
+
+corpus.py generates synthetic scripts, run.py times the converter against
+them and compares the numbers with baseline.json.
+"""
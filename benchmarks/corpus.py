@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Generate synthetic QuantumultX scripts for benchmarking"""
+
+import os
+import json
+import random
+import argparse
+import hashlib
+
+# Entry kinds the generator can mix, with the weights used by default
+DEFAULT_MIX = {
+    "reject": 3,
+    "script-response-body": 5,
+    "script-request-header": 1,
+    "filter_local": 2
+}
+
+WORDS = ["api", "user", "vip", "member", "config", "ad", "splash", "account",
+         "profile", "subscribe", "pay", "info", "v1", "v2", "app", "data"]
+
+class CorpusGenerator:
+    """Build reproducible QX scripts from a seed and a few size knobs
+    
+    rewrites:         entries per script (rewrite_local plus filter_local)
+    header_padding:   extra comment lines in the header block
+    body_lines:       JavaScript lines after the header
+    comment_density:  share of entries preceded by a '#' comment line
+    mix:              weights of reject / script-response-body / script-request-header / filter_local
+    """
+    
+    def __init__(self, rewrites=6, header_padding=4, body_lines=40, comment_density=0.3,
+                 mix=None, seed=1):
+        self.rewrites = rewrites
+        self.header_padding = header_padding
+        self.body_lines = body_lines
+        self.comment_density = comment_density
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.seed = seed
+    
+    def params(self):
+        """Settings that fully determine the generated corpus"""
+        return {
+            "rewrites": self.rewrites,
+            "header_padding": self.header_padding,
+            "body_lines": self.body_lines,
+            "comment_density": self.comment_density,
+            "mix": self.mix,
+            "seed": self.seed
+        }
+    
+    def fingerprint(self):
+        """Short hash of params(), used to name cached corpora"""
+        encoded = json.dumps(self.params(), sort_keys=True).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()[:12]
+    
+    def host(self, rng):
+        """Random host name such as api.vip3.example42.com"""
+        labels = [rng.choice(WORDS) for _ in range(rng.randint(1, 2))]
+        return ".".join(labels + [f"example{rng.randint(0, 999)}", rng.choice(["com", "cn", "net"])])
+    
+    def url_pattern(self, rng, host):
+        """Escaped URL regex below host, like the ones in real scripts"""
+        path = "\\/".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        escaped = host.replace(".", "\\.")
+        if rng.random() < 0.3:
+            return f"^https?:\\/\\/{escaped}\\/{path}\\/({rng.choice(WORDS)}|{rng.choice(WORDS)})"
+        return f"^https:\\/\\/{escaped}\\/{path}"
+    
+    def generate_script(self, index):
+        """Return the text of script number index"""
+        rng = random.Random(f"{self.seed}:{index}")
+        name = f"bench{index}"
+        hosts = [self.host(rng) for _ in range(rng.randint(1, 3))]
+        kinds = list(self.mix)
+        weights = [self.mix[kind] for kind in kinds]
+        
+        filters = []
+        rewrites = []
+        for number in range(self.rewrites):
+            kind = rng.choices(kinds, weights)[0]
+            host = rng.choice(hosts)
+            target = filters if kind == "filter_local" else rewrites
+            if rng.random() < self.comment_density:
+                target.append(f"# {rng.choice(WORDS)} {number}")
+            
+            if kind == "filter_local":
+                if rng.random() < 0.5:
+                    filters.append(f"host, {host}, reject")
+                else:
+                    filters.append(f"url-regex,{self.url_pattern(rng, host)},reject")
+            elif kind == "reject":
+                rewrites.append(f"{self.url_pattern(rng, host)} url {rng.choice(['reject', 'reject-200', 'reject-dict'])}")
+            else:
+                script = f"https://raw.githubusercontent.com/bench/Script/main/qx/{name}.js"
+                rewrites.append(f"{self.url_pattern(rng, host)} url {kind} {script}")
+        
+        lines = ["/*", "", f"📜 ✨ Bench {index} ✨", "📅 更新时间：2024年01月01日", "🔓 功能：解锁永久 VIP"]
+        lines += [f"🔆 {' '.join(rng.choice(WORDS) for _ in range(6))}" for _ in range(self.header_padding)]
+        lines.append("")
+        if filters:
+            lines += ["[filter_local]"] + filters + [""]
+        lines += ["[rewrite_local]"] + rewrites + [""]
+        lines += ["[mitm]", f"hostname = {', '.join(hosts)}", "", "*/", ""]
+        
+        # Script body that the header reader must never need to look at
+        for number in range(self.body_lines):
+            lines.append(f"let v{number} = JSON.parse($response.body || '{{}}'); // {rng.choice(WORDS)}")
+        lines.append("$done({});")
+        return "\n".join(lines) + "\n"
+    
+    def write_corpus(self, directory, count):
+        """Write count scripts into directory, reusing it if it already holds this corpus"""
+        stamp_path = os.path.join(directory, ".corpus.json")
+        stamp = {"count": count, "fingerprint": self.fingerprint(), "params": self.params()}
+        try:
+            with open(stamp_path, 'r', encoding='utf-8') as f:
+                if json.load(f) == stamp:
+                    return directory
+        except (OSError, ValueError):
+            pass
+        
+        os.makedirs(directory, exist_ok=True)
+        for index in range(count):
+            with open(os.path.join(directory, f"bench{index}.js"), 'w', encoding='utf-8') as f:
+                f.write(self.generate_script(index))
+        
+        with open(stamp_path, 'w', encoding='utf-8') as f:
+            json.dump(stamp, f, indent=2)
+        return directory
+
+def parse_mix(text):
+    """Parse 'reject=3,filter_local=1' into a weight dict"""
+    mix = {}
+    for item in text.split(','):
+        kind, _, weight = item.partition('=')
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown entry kind: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+def add_generator_arguments(parser):
+    """Generator options shared by this script and the benchmark runner"""
+    parser.add_argument("--rewrites", type=int, default=6, help="entries per script (default: 6)")
+    parser.add_argument("--header-padding", type=int, default=4,
+                        help="extra comment lines in each header (default: 4)")
+    parser.add_argument("--body-lines", type=int, default=40,
+                        help="JavaScript lines after the header (default: 40)")
+    parser.add_argument("--comment-density", type=float, default=0.3,
+                        help="share of entries preceded by a comment line (default: 0.3)")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help="entry weights, e.g. reject=3,script-response-body=5,filter_local=2")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default: 1)")
+
+def generator_from_args(args):
+    """CorpusGenerator configured from add_generator_arguments() options"""
+    return CorpusGenerator(args.rewrites, args.header_padding, args.body_lines,
+                           args.comment_density, args.mix, args.seed)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Generate a synthetic QuantumultX script corpus")
+    parser.add_argument("directory", help="output folder")
+    parser.add_argument("-n", "--count", type=int, default=100, help="number of scripts (default: 100)")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    
+    generator_from_args(args).write_corpus(args.directory, args.count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Time the converter on synthetic corpora and compare against baseline.json
+
+Run from the repository root:
+
+    python -m benchmarks.run --sizes 100,10000
+    python -m benchmarks.run --update-baseline
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import tempfile
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from script_converter import ScriptConverter, CONVERTER_VERSION
+from benchmarks.corpus import add_generator_arguments, generator_from_args
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SIZES = "100,10000,100000"
+
+# Benchmarks dominated by file system writes, compared with io_tolerance
+IO_BENCHMARKS = {"process_directory", "process_directory_unchanged"}
+
+DEFAULT_REPEAT = 5
+
+def calibrate(rounds=15):
+    """Median time of a fixed pure Python workload, used to scale results across machines
+    
+    The median rather than the best round, since a short loop's best time
+    catches momentary frequency boosts the benchmarks themselves never see.
+    """
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        total = 0
+        for number in range(200000):
+            total += len(str(number)) ^ (number & 7)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+class BenchmarkRunner:
+    """Run every benchmark for one corpus size and collect per-file timings"""
+    
+    def __init__(self, generator, corpus_root, repeat=DEFAULT_REPEAT, jobs=1):
+        self.generator = generator
+        self.corpus_root = corpus_root
+        self.repeat = repeat
+        self.jobs = jobs
+    
+    def time_runs(self, function):
+        """Wall times of repeat calls of function"""
+        times = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - started)
+        return times
+    
+    def run_size(self, count):
+        """Time every benchmark on a corpus of count scripts"""
+        directory = os.path.join(self.corpus_root, f"corpus-{self.generator.fingerprint()}-{count}")
+        self.generator.write_corpus(directory, count)
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".js"))
+        
+        converter = ScriptConverter()
+        results = {}
+        
+        def record(name, times):
+            # The best run is the timing, how far the median strays from it is the noise
+            best = min(times)
+            results[name] = {"total_ms": round(best * 1000, 3),
+                             "per_file_us": round(best / count * 1e6, 3),
+                             "noise": round(statistics.median(times) / best - 1, 3) if best else 0.0}
+        
+        # Header reading and parsing
+        infos = []
+        def extract():
+            infos[:] = [converter.extract_all_info(path) for path in paths]
+        record("extract_all_info", self.time_runs(extract))
+        
+        # Rendering only, on the parsed scripts
+        record("create_loon_config", self.time_runs(lambda: [converter.create_loon_config(info) for info in infos]))
+        record("create_surge_config", self.time_runs(lambda: [converter.create_surge_config(info) for info in infos]))
+        
+        # Full pipeline: a cold run writing every output, then a no-op run served by the manifest
+        cold, warm = [], []
+        for _ in range(self.repeat):
+            output_dir = tempfile.mkdtemp(prefix="qxbench-out-")
+            cwd = os.getcwd()
+            try:
+                os.chdir(output_dir)
+                cold_seconds = self.time_process_directory(directory)
+                warm_seconds = self.time_process_directory(directory)
+            finally:
+                os.chdir(cwd)
+                shutil.rmtree(output_dir, ignore_errors=True)
+            cold.append(cold_seconds)
+            warm.append(warm_seconds)
+        record("process_directory", cold)
+        record("process_directory_unchanged", warm)
+        return results
+    
+    def time_process_directory(self, directory):
+        """Wall time of one process_directory call in the current directory"""
+        converter = ScriptConverter()
+        converter.jobs = self.jobs
+        started = time.perf_counter()
+        if not converter.process_directory(directory):
+            raise RuntimeError(f"conversion failed for {directory}")
+        return time.perf_counter() - started
+
+def compare(results, baseline, scale, tolerance, io_tolerance, min_ms):
+    """Return (size, benchmark, baseline_us, current_us) for every regression beyond tolerance
+    
+    Baseline entries shorter than min_ms are timer noise and are not compared.
+    The noise measured in both runs widens the tolerance, so a busy machine
+    does not fail the gate on its own.
+    """
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, timing in benchmarks.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if not previous or previous["total_ms"] < min_ms:
+                continue
+            expected = previous["per_file_us"] * scale
+            allowed = io_tolerance if name in IO_BENCHMARKS else tolerance
+            allowed += timing.get("noise", 0.0) + previous.get("noise", 0.0)
+            if timing["per_file_us"] > expected * (1 + allowed):
+                regressions.append((size, name, round(expected, 3), timing["per_file_us"]))
+    return regressions
+
+def merge_best(results, rerun):
+    """Per benchmark, the faster of two runs of the same size"""
+    return {name: min(timing, rerun.get(name, timing), key=lambda entry: entry["per_file_us"])
+            for name, timing in results.items()}
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark the QuantumultX script converter")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"comma separated corpus sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"runs per benchmark, best is kept (default: {DEFAULT_REPEAT})")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="worker processes for process_directory (default: 1)")
+    parser.add_argument("--corpus-root", default=os.path.join(tempfile.gettempdir(), "qxbench"),
+                        help="where generated corpora are cached")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline results file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline before failing (default: 0.25)")
+    parser.add_argument("--io-tolerance", type=float, default=1.0,
+                        help="allowed slowdown of the file writing benchmarks (default: 1.0)")
+    parser.add_argument("--min-ms", type=float, default=250.0,
+                        help="skip baseline entries shorter than this many milliseconds (default: 250)")
+    parser.add_argument("--update-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    
+    # Per-file INFO logs would dominate the timings
+    logging.getLogger('script_converter').setLevel(logging.WARNING)
+    
+    generator = generator_from_args(args)
+    runner = BenchmarkRunner(generator, args.corpus_root, max(1, args.repeat), max(1, args.jobs))
+    calibration = calibrate()
+    
+    results = {}
+    for size in [int(value) for value in args.sizes.split(',') if value.strip()]:
+        results[str(size)] = runner.run_size(size)
+        for name, timing in results[str(size)].items():
+            print(f"{size:>7} files  {name:<28} {timing['total_ms']:>12.1f} ms  {timing['per_file_us']:>10.1f} us/file")
+    
+    report = {
+        "converter_version": CONVERTER_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "calibration_ms": round(calibration * 1000, 3),
+        "jobs": runner.jobs,
+        "repeat": runner.repeat,
+        "corpus": generator.params(),
+        "results": results
+    }
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+    
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+    
+    if baseline.get("corpus") != report["corpus"] or baseline.get("jobs") != report["jobs"]:
+        print("Baseline was recorded with different corpus or job settings; skipping comparison")
+        return
+    
+    # Scale the baseline by how much slower this machine is on the calibration loop
+    scale = calibration * 1000 / baseline["calibration_ms"]
+    regressions = compare(results, baseline, scale, args.tolerance, args.io_tolerance, args.min_ms)
+    if regressions:
+        # A slowdown has to show up again before it fails the gate; one noisy run does not
+        for size in sorted({size for size, *_ in regressions}, key=int):
+            print(f"Re-measuring {size} files")
+            results[size] = merge_best(results[size], runner.run_size(int(size)))
+        scale = (scale + calibrate() * 1000 / baseline["calibration_ms"]) / 2
+        regressions = compare(results, baseline, scale, args.tolerance, args.io_tolerance, args.min_ms)
+    for size, name, expected, current in regressions:
+        print(f"REGRESSION {size} files {name}: {current} us/file, baseline {expected} us/file")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} ({args.io_tolerance:.0%} for file writes, "
+          f"machine scale {scale:.2f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compile response-body scripts that only replace text or override JSON fields
+
+Many scripts read $response.body, apply a fixed list of body.replace(/re/g, '...')
+calls or assign constants to fields of the parsed JSON, and hand the result to
+$done. Surge ([Body Rewrite]) and Loon ([Rewrite]) can do both natively, which
+saves starting a JS engine for every matched response. The analysis tokenizes
+the script and accepts only straight-line code of those shapes; anything it
+does not fully understand stays a script.
+
+Notification and $persistentStore bookkeeping that never touches the body is
+dropped from compiled scripts and listed in the report.
+"""
+
+import os
+import re
+import json
+import argparse
+
+# Identifiers that may appear in statements dropped as pure side effects
+SIDE_EFFECT_NAMES = {"var", "let", "const", "if", "else", "new", "Date", "now", "parseInt", "parseFloat",
+                     "Number", "String", "Math", "true", "false", "null", "undefined",
+                     "$persistentStore", "$prefs", "$notification", "$notify", "console"}
+
+# Keywords after which a slash starts a regex literal rather than a division
+REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw"}
+REGEX_AFTER_PUNCT = set("(,=:[!&|?{};+-*%<>~^")
+
+PUNCTUATORS = sorted(["===", "!==", "...", "=>", "==", "!=", "<=", ">=", "&&", "||", "??", "?.", "++", "--",
+                      "+=", "-=", "*=", "/=", "**"] + list("{}()[];,.<>+-*/%&|^!~?:="), key=len, reverse=True)
+
+IDENT_RE = re.compile(r'[A-Za-z_$\u0080-\uffff][\w$\u0080-\uffff]*')
+# ASCII digits only, as in JS; the tokenizer tests for a number start with the same set
+DIGITS = set("0123456789")
+NUMBER_RE = re.compile(r'0[xX][0-9a-fA-F]+|(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?')
+HEX_DIGITS = set("0123456789abcdefABCDEF")
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "v": "\v", "0": "\0"}
+JQ_KEY_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+# Characters a JS string has to escape to be used as a literal regex
+REGEX_SPECIAL = set("\\^$.|?*+()[]{}/")
+
+class NotCompilable(Exception):
+    """The script does something a native body rewrite cannot express"""
+
+class Token:
+    __slots__ = ("kind", "value", "newline")
+    
+    def __init__(self, kind, value, newline):
+        self.kind = kind
+        self.value = value
+        self.newline = newline
+    
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r})"
+
+def is_(token, kind, value=None):
+    return token is not None and token.kind == kind and (value is None or token.value == value)
+
+def strip_header(source):
+    """Script code after the leading config comment block"""
+    start = source.find('/*')
+    if start < 0:
+        return source
+    end = source.find('*/', start + 2)
+    return source[end + 2:] if end >= 0 else ""
+
+def read_string(source, i, quote):
+    """(decoded string, index after the closing quote)"""
+    chars = []
+    i += 1
+    while i < len(source):
+        char = source[i]
+        if char == quote:
+            return "".join(chars), i + 1
+        if char == "\n" and quote != "`":
+            break
+        if char == "\\":
+            i += 1
+            escape = source[i:i + 1]
+            if escape in ("u", "x"):
+                # \uXXXX or \xXX; \u{...} and malformed escapes leave the script alone
+                width = 4 if escape == "u" else 2
+                digits = source[i + 1:i + 1 + width]
+                if len(digits) != width or not set(digits) <= HEX_DIGITS:
+                    raise NotCompilable(f"unsupported \\{escape} escape")
+                chars.append(chr(int(digits, 16)))
+                i += 1 + width
+                continue
+            if escape != "\n":
+                chars.append(ESCAPES.get(escape, escape))
+            i += 1
+            continue
+        chars.append(char)
+        i += 1
+    raise NotCompilable("unterminated string")
+
+def read_regex(source, i):
+    """((pattern, flags), index after the flags) for a regex literal at i"""
+    j = i + 1
+    in_class = False
+    while j < len(source):
+        char = source[j]
+        if char == "\\":
+            j += 2
+            continue
+        if char == "\n":
+            break
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            flags = re.match(r'[a-z]*', source[j + 1:]).group()
+            return (source[i + 1:j], flags), j + 1 + len(flags)
+        j += 1
+    raise NotCompilable("unterminated regex")
+
+def tokenize(source):
+    """Tokens of a JS snippet; comments are skipped, strings decoded"""
+    tokens = []
+    i = 0
+    newline = False
+    while i < len(source):
+        char = source[i]
+        if char in " \t\r\n\ufeff\u00a0":
+            newline = newline or char == "\n"
+            i += 1
+            continue
+        if source.startswith("//", i):
+            end = source.find("\n", i)
+            i = len(source) if end < 0 else end
+            continue
+        if source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            if end < 0:
+                raise NotCompilable("unterminated comment")
+            newline = newline or "\n" in source[i:end]
+            i = end + 2
+            continue
+        
+        previous = tokens[-1] if tokens else None
+        if char in "'\"`":
+            value, i = read_string(source, i, char)
+            kind = "template" if char == "`" and "${" in value else "str"
+            tokens.append(Token(kind, value, newline))
+        elif char == "/" and (previous is None or (previous.kind == "punct" and previous.value in REGEX_AFTER_PUNCT)
+                              or (previous.kind == "ident" and previous.value in REGEX_KEYWORDS)):
+            value, i = read_regex(source, i)
+            tokens.append(Token("regex", value, newline))
+        elif char in DIGITS or (char == "." and source[i + 1:i + 2] in DIGITS):
+            match = NUMBER_RE.match(source, i)
+            if match is None:
+                raise NotCompilable(f"unreadable number at offset {i}")
+            text = match.group()
+            value = int(text, 16) if text[:2] in ("0x", "0X") else (float(text) if any(c in text for c in ".eE") else int(text))
+            tokens.append(Token("num", value, newline))
+            i = match.end()
+        else:
+            match = IDENT_RE.match(source, i)
+            if match:
+                tokens.append(Token("ident", match.group(), newline))
+                i = match.end()
+            else:
+                for punct in PUNCTUATORS:
+                    if source.startswith(punct, i):
+                        break
+                else:
+                    raise NotCompilable(f"unexpected character {char!r}")
+                tokens.append(Token("punct", punct, newline))
+                i += len(punct)
+        newline = False
+    return tokens
+
+def ends_expression(token):
+    return token.kind in ("ident", "num", "str", "regex", "template") or token.value in (")", "]", "}")
+
+def continues_expression(token):
+    return token.kind == "punct" and token.value not in ("{", "!", "++", "--", "...")
+
+def split_statements(tokens):
+    """Top-level statements, split at semicolons, closed blocks and automatic semicolon insertion points"""
+    statements = []
+    current = []
+    depth = 0
+    for index, token in enumerate(tokens):
+        if depth == 0 and current and token.newline and ends_expression(current[-1]) and not continues_expression(token):
+            statements.append(current)
+            current = []
+        
+        if token.kind == "punct" and token.value in "([{":
+            depth += 1
+        elif token.kind == "punct" and token.value in ")]}":
+            depth -= 1
+            if depth < 0:
+                raise NotCompilable("unbalanced brackets")
+        
+        if depth == 0 and is_(token, "punct", ";"):
+            if current:
+                statements.append(current)
+            current = []
+            continue
+        current.append(token)
+        
+        # A block statement ends with its closing brace unless an else follows
+        if depth == 0 and is_(token, "punct", "}") and current[0].kind == "ident" \
+                and current[0].value in ("if", "for", "while", "function"):
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if not is_(following, "ident", "else"):
+                statements.append(current)
+                current = []
+    if depth != 0:
+        raise NotCompilable("unbalanced brackets")
+    if current:
+        statements.append(current)
+    return statements
+
+class Cursor:
+    """Sequential reader over a statement's tokens"""
+    
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.i = 0
+    
+    def peek(self, offset=0):
+        index = self.i + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+    
+    def at_end(self):
+        return self.i >= len(self.tokens)
+    
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if is_(token, kind, value):
+            self.i += 1
+            return token
+        return None
+    
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            raise NotCompilable(f"unsupported statement near {self.text()!r}")
+        return token
+    
+    def punct(self, *values):
+        for value in values:
+            self.expect("punct", value)
+    
+    def text(self):
+        words = []
+        for token in self.tokens[self.i:self.i + 8]:
+            words.append(f"/{token.value[0]}/{token.value[1]}" if token.kind == "regex" else
+                         json.dumps(token.value, ensure_ascii=False) if token.kind == "str" else str(token.value))
+        return " ".join(words)
+
+def parse_literal(cursor):
+    """Python value of a JSON-compatible JS literal"""
+    if cursor.accept("punct", "-"):
+        return -cursor.expect("num").value
+    token = cursor.peek()
+    if token is None:
+        raise NotCompilable("missing value")
+    if token.kind in ("str", "num"):
+        cursor.i += 1
+        return token.value
+    if token.kind == "ident" and token.value in ("true", "false", "null"):
+        cursor.i += 1
+        return {"true": True, "false": False, "null": None}[token.value]
+    if cursor.accept("punct", "["):
+        items = []
+        while not cursor.accept("punct", "]"):
+            items.append(parse_literal(cursor))
+            if not cursor.accept("punct", ","):
+                cursor.expect("punct", "]")
+                break
+        return items
+    if cursor.accept("punct", "{"):
+        return parse_object_entries(cursor)
+    raise NotCompilable(f"value is not a constant near {cursor.text()!r}")
+
+def parse_object_entries(cursor):
+    """Entries of an object literal whose opening brace was consumed, up to its closing brace"""
+    value = {}
+    while not cursor.accept("punct", "}"):
+        key = cursor.peek()
+        if key is None or key.kind not in ("ident", "str", "num"):
+            raise NotCompilable(f"computed or spread key near {cursor.text()!r}")
+        cursor.i += 1
+        cursor.expect("punct", ":")
+        value[str(key.value)] = parse_literal(cursor)
+        if not cursor.accept("punct", ","):
+            cursor.expect("punct", "}")
+            break
+    return value
+
+def parse_path(cursor):
+    """Property path after an object name: ['a', 0, 'b'] for .a[0]["b"]"""
+    path = []
+    while True:
+        if cursor.accept("punct", "."):
+            path.append(cursor.expect("ident").value)
+        elif is_(cursor.peek(), "punct", "[") and cursor.peek(1) is not None and cursor.peek(1).kind in ("str", "num"):
+            cursor.i += 1
+            path.append(cursor.peek().value)
+            cursor.i += 1
+            cursor.expect("punct", "]")
+        else:
+            return path
+
+def jq_path(path):
+    """jq path expression: .a[0]["b-c"]"""
+    parts = []
+    for key in path:
+        if isinstance(key, int):
+            parts.append(f"[{key}]")
+        elif JQ_KEY_RE.match(key):
+            parts.append(f".{key}")
+        else:
+            parts.append(f"[{json.dumps(key, ensure_ascii=False)}]")
+    expression = "".join(parts)
+    return expression if expression.startswith(".") else "." + expression
+
+def jq_value(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def escape_regex(text):
+    return "".join(f"\\{char}" if char in REGEX_SPECIAL else char for char in text)
+
+def native_replacement(pattern, flags, replacement):
+    """(regex, replacement) usable in a rewrite line, or NotCompilable"""
+    if flags.replace("g", ""):
+        raise NotCompilable(f"regex flags {flags!r} have no native equivalent")
+    if "g" not in flags:
+        raise NotCompilable("replace without the g flag changes only the first match")
+    if "$" in replacement:
+        raise NotCompilable("replacement uses $ substitutions")
+    if not replacement or any(char.isspace() for char in replacement):
+        raise NotCompilable("replacement is empty or contains whitespace")
+    if any(char.isspace() and char != " " for char in pattern):
+        raise NotCompilable("regex contains whitespace characters")
+    return pattern.replace(" ", "\\x20"), replacement
+
+class BodyRewrite:
+    """Native equivalent of one script: regex replacements or a jq program, never both"""
+    __slots__ = ("replacements", "jq", "dropped")
+    
+    def __init__(self, replacements=None, jq=None, dropped=None):
+        self.replacements = replacements or []
+        self.jq = jq
+        self.dropped = dropped or []
+    
+    def fields(self):
+        return (tuple(self.replacements), self.jq, tuple(self.dropped))
+    
+    def __eq__(self, other):
+        return isinstance(other, BodyRewrite) and self.fields() == other.fields()
+    
+    @property
+    def kind(self):
+        return "jq" if self.jq is not None else "replace"
+    
+    def surge_line(self, pattern):
+        """[Body Rewrite] line for a Surge module"""
+        if self.jq is not None:
+            return f"http-response-jq {pattern} '{self.jq}'"
+        return f"http-response {pattern} " + " ".join(f"{regex} {text}" for regex, text in self.replacements)
+    
+    def loon_line(self, pattern):
+        """[Rewrite] line for a Loon plugin"""
+        if self.jq is not None:
+            return f"{pattern} response-body-json-jq '{self.jq}'"
+        return f"{pattern} response-body-replace-regex " + " ".join(f"{regex} {text}" for regex, text in self.replacements)
+    
+    def summary(self):
+        data = {"kind": self.kind, "dropped": self.dropped}
+        if self.jq is not None:
+            data["jq"] = self.jq
+        else:
+            data["replacements"] = [list(pair) for pair in self.replacements]
+        return data
+    
+    def __repr__(self):
+        return f"BodyRewrite({self.kind}, {self.jq or self.replacements!r})"
+
+class BodyAnalysis:
+    """Walks the top-level statements of a script, tracking which variable holds the body"""
+    
+    def __init__(self):
+        self.current = None          # variable holding the (possibly modified) body text
+        self.json_var = None         # variable holding JSON.parse of the body
+        self.serialized = False      # current holds JSON.stringify(json_var)
+        self.replacements = []
+        self.jq = []
+        self.dropped = []
+        self.side_effect_vars = set()
+        self.done = False
+    
+    def feed(self, statement):
+        if self.done:
+            raise NotCompilable("code after $done")
+        if self.constant_body(statement) or self.drop_side_effect(statement):
+            return
+        
+        cursor = Cursor(statement)
+        first = cursor.peek()
+        if is_(first, "ident", "if"):
+            return self.guard(cursor)
+        if is_(first, "ident", "$done"):
+            return self.finish(cursor)
+        if is_(first, "punct", "["):
+            return self.replacement_list(cursor)
+        if is_(first, "ident", "delete"):
+            cursor.i += 1
+            self.require_json(cursor.expect("ident").value)
+            self.jq.append(f"del({jq_path(parse_path(cursor))})")
+            return self.end(cursor)
+        
+        declared = cursor.accept("ident", "var") or cursor.accept("ident", "let") or cursor.accept("ident", "const")
+        name = cursor.expect("ident").value
+        if name == self.json_var and not declared:
+            path = parse_path(cursor)
+            cursor.expect("punct", "=")
+            if is_(cursor.peek(), "punct", "{") and is_(cursor.peek(1), "punct", "..."):
+                # obj.data = {...obj.data, key: value} merges like jq's +=
+                cursor.punct("{", "...")
+                self.require_json(cursor.expect("ident").value)
+                if parse_path(cursor) != path:
+                    raise NotCompilable("spreads a different object")
+                value = {}
+                if cursor.accept("punct", ","):
+                    value = parse_object_entries(cursor)
+                else:
+                    cursor.expect("punct", "}")
+                self.end(cursor)
+                self.jq.append(f"{jq_path(path)} += {jq_value(value)}")
+                return
+            value = parse_literal(cursor)
+            self.end(cursor)
+            if not path:
+                # Whole object replaced, earlier field changes no longer matter
+                self.jq = [jq_value(value)]
+            else:
+                self.jq.append(f"{jq_path(path)} = {jq_value(value)}")
+            return
+        cursor.expect("punct", "=")
+        self.assignment(name, cursor)
+    
+    def constant_body(self, statement):
+        """var obj = {...} before anything read the body: the script answers with a constant"""
+        cursor = Cursor(statement)
+        if not (cursor.accept("ident", "var") or cursor.accept("ident", "let") or cursor.accept("ident", "const")):
+            return False
+        name = cursor.accept("ident")
+        if name is None or not cursor.accept("punct", "=") or not is_(cursor.peek(), "punct") \
+                or cursor.peek().value not in ("{", "["):
+            return False
+        if self.json_var is not None or self.replacements or self.jq:
+            raise NotCompilable("object literal next to the parsed body")
+        value = parse_literal(cursor)
+        self.end(cursor)
+        self.json_var = name.value
+        self.jq = [jq_value(value)]
+        return True
+    
+    def drop_side_effect(self, statement):
+        """Skip statements that only notify or keep state, never touching the request or body
+        
+        Such a statement names nothing but side-effect APIs, literals and variables
+        declared by earlier dropped statements.
+        """
+        names = set()
+        for index, token in enumerate(statement):
+            if token.kind == "ident" and not (index and is_(statement[index - 1], "punct", ".")):
+                names.add(token.value)
+        if names & {"$response", "$request", "$done", self.current, self.json_var}:
+            return False
+        
+        declared = None
+        if statement[0].value in ("var", "let", "const") and len(statement) > 1 and statement[1].kind == "ident":
+            declared = statement[1].value
+        if not names - {declared} <= SIDE_EFFECT_NAMES | self.side_effect_vars:
+            return False
+        
+        if declared is not None:
+            self.side_effect_vars.add(declared)
+        self.dropped.append(" ".join(str(token.value) for token in statement if token.kind != "regex")[:80])
+        return True
+    
+    def guard(self, cursor):
+        """if (!body) { $done({}) } is implied: native rewrites leave empty bodies alone"""
+        cursor.expect("ident", "if")
+        cursor.punct("(", "!")
+        if cursor.expect("ident").value != self.current:
+            raise NotCompilable("conditional code")
+        cursor.punct(")")
+        braces = cursor.accept("punct", "{")
+        cursor.expect("ident", "$done")
+        cursor.punct("(", "{", "}", ")")
+        cursor.accept("punct", ";")
+        if braces:
+            cursor.expect("punct", "}")
+        self.end(cursor)
+    
+    def source_expression(self, cursor):
+        """Name of the body text an expression reads: a body variable or $response.body"""
+        token = cursor.expect("ident")
+        if token.value == "$response":
+            cursor.punct(".")
+            cursor.expect("ident", "body")
+            if self.replacements or self.jq:
+                raise NotCompilable("body read again after being modified")
+            return "$response.body"
+        if token.value != self.current:
+            raise NotCompilable(f"unsupported use of {token.value}")
+        return token.value
+    
+    def assignment(self, name, cursor):
+        if is_(cursor.peek(), "ident", "JSON"):
+            cursor.i += 1
+            cursor.punct(".")
+            method = cursor.expect("ident").value
+            cursor.punct("(")
+            if method == "parse":
+                self.source_expression(cursor)
+                cursor.punct(")")
+                self.end(cursor)
+                if self.replacements:
+                    raise NotCompilable("mixes text replacements with JSON changes")
+                self.json_var = name
+                self.side_effect_vars.discard(name)
+                return
+            if method == "stringify":
+                self.require_json(cursor.expect("ident").value)
+                cursor.punct(")")
+                self.end(cursor)
+                self.current = name
+                self.serialized = True
+                return
+            raise NotCompilable(f"JSON.{method}")
+        
+        self.source_expression(cursor)
+        while cursor.accept("punct", "."):
+            method = cursor.expect("ident").value
+            if method not in ("replace", "replaceAll"):
+                raise NotCompilable(f"body.{method}")
+            if self.json_var is not None:
+                raise NotCompilable("mixes text replacements with JSON changes")
+            cursor.punct("(")
+            target = cursor.peek()
+            cursor.i += 1
+            cursor.punct(",")
+            replacement = cursor.expect("str").value
+            cursor.punct(")")
+            if target.kind == "regex":
+                pattern, flags = target.value
+                if method == "replaceAll":
+                    flags = flags if "g" in flags else flags + "g"
+            elif target.kind == "str":
+                if method == "replace":
+                    raise NotCompilable("string replace changes only the first match")
+                pattern, flags = escape_regex(target.value), "g"
+            else:
+                raise NotCompilable("replacement pattern is not a literal")
+            self.replacements.append(native_replacement(pattern, flags, replacement))
+        self.end(cursor)
+        self.current = name
+        self.side_effect_vars.discard(name)
+    
+    def replacement_list(self, cursor):
+        """[{pattern: /re/g, replacement: '...'}, ...].forEach(({pattern, replacement}) => { body = body.replace(pattern, replacement) })"""
+        cursor.expect("punct", "[")
+        pairs = []
+        while not cursor.accept("punct", "]"):
+            cursor.expect("punct", "{")
+            item = {}
+            while not cursor.accept("punct", "}"):
+                key = cursor.expect("ident").value
+                cursor.expect("punct", ":")
+                token = cursor.peek()
+                if token is None or token.kind not in ("regex", "str"):
+                    raise NotCompilable("replacement list entry is not a literal")
+                cursor.i += 1
+                item[key] = token
+                if not cursor.accept("punct", ","):
+                    cursor.expect("punct", "}")
+                    break
+            pairs.append(item)
+            if not cursor.accept("punct", ","):
+                cursor.expect("punct", "]")
+                break
+        
+        cursor.punct(".")
+        cursor.expect("ident", "forEach")
+        cursor.punct("(", "(", "{")
+        first = cursor.expect("ident").value
+        cursor.punct(",")
+        second = cursor.expect("ident").value
+        cursor.punct("}", ")", "=>", "{")
+        if cursor.expect("ident").value != self.current:
+            raise NotCompilable("forEach does not update the body")
+        cursor.punct("=")
+        if cursor.expect("ident").value != self.current:
+            raise NotCompilable("forEach does not update the body")
+        cursor.punct(".")
+        cursor.expect("ident", "replace")
+        cursor.punct("(")
+        pattern_key = cursor.expect("ident").value
+        cursor.punct(",")
+        replacement_key = cursor.expect("ident").value
+        cursor.punct(")")
+        cursor.accept("punct", ";")
+        cursor.punct("}", ")")
+        self.end(cursor)
+        if {pattern_key, replacement_key} != {first, second} or pattern_key == replacement_key:
+            raise NotCompilable("forEach does not replace pattern with replacement")
+        if self.json_var is not None:
+            raise NotCompilable("mixes text replacements with JSON changes")
+        
+        for item in pairs:
+            target, replacement = item.get(pattern_key), item.get(replacement_key)
+            if target is None or not is_(replacement, "str"):
+                raise NotCompilable("replacement list entry is incomplete")
+            if target.kind == "str":
+                raise NotCompilable("string replace changes only the first match")
+            self.replacements.append(native_replacement(*target.value, replacement.value))
+    
+    def finish(self, cursor):
+        """$done({body: ...}) handing over the modified body"""
+        cursor.expect("ident", "$done")
+        cursor.punct("(", "{")
+        key = cursor.accept("ident", "body") or cursor.accept("str", "body")
+        if key is None:
+            raise NotCompilable("$done without a body")
+        if cursor.accept("punct", ":"):
+            token = cursor.expect("ident")
+            if token.value == "JSON":
+                cursor.punct(".")
+                cursor.expect("ident", "stringify")
+                cursor.punct("(")
+                self.require_json(cursor.expect("ident").value)
+                cursor.punct(")")
+                self.serialized = True
+            elif token.value != self.current:
+                raise NotCompilable(f"$done returns {token.value}, not the modified body")
+        elif key.kind != "ident" or self.current != "body":
+            raise NotCompilable("$done returns something other than the body")
+        cursor.accept("punct", ",")
+        cursor.punct("}", ")")
+        self.end(cursor)
+        if self.json_var is not None and not self.serialized:
+            raise NotCompilable("parsed JSON is never written back")
+        self.done = True
+    
+    def require_json(self, name):
+        if name != self.json_var:
+            raise NotCompilable(f"{name} is not the parsed body")
+    
+    def end(self, cursor):
+        if not cursor.at_end():
+            raise NotCompilable(f"unsupported statement near {cursor.text()!r}")
+    
+    def result(self):
+        if not self.done:
+            raise NotCompilable("no $done with the body")
+        if self.jq:
+            jq = " | ".join(self.jq)
+            if "'" in jq:
+                raise NotCompilable("jq program would need single quotes")
+            return BodyRewrite(jq=jq, dropped=self.dropped)
+        if self.replacements:
+            return BodyRewrite(replacements=self.replacements, dropped=self.dropped)
+        raise NotCompilable("the body is never changed")
+
+def compile_body(source):
+    """BodyRewrite equivalent to a script's code; raises NotCompilable with the reason otherwise"""
+    analysis = BodyAnalysis()
+    for statement in split_statements(tokenize(strip_header(source))):
+        analysis.feed(statement)
+    return analysis.result()
+
+def body_script_path(info):
+    """script-path of the response-body script the source file itself implements
+    
+    The file's code is only known to be that script when every script entry
+    points at the same response-body script named like the file.
+    """
+    paths = {script.script_path for script in info.scripts if script.script_path}
+    if len(paths) != 1:
+        raise NotCompilable("no single script" if not paths else "several different scripts")
+    path = paths.pop()
+    for script in info.scripts:
+        if script.rule_type != "http-response" or not script.requires_body:
+            raise NotCompilable("not a response-body script")
+    stem = os.path.splitext(os.path.basename(path.split('?')[0]))[0].lower()
+    if stem != os.path.splitext(info.filename)[0].lower():
+        raise NotCompilable(f"script-path {os.path.basename(path)} is not this file")
+    return path
+
+def main():
+    """Main function"""
+    from script_converter import ScriptConverter, add_source_arguments, write_json_report
+    from input_providers import ProviderError
+    
+    parser = argparse.ArgumentParser(description="Report which QuantumultX scripts compile to native body rewrites")
+    add_source_arguments(parser)
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    
+    converter = ScriptConverter()
+    report = {"compiled": {}, "scripts": {}, "skipped": {}}
+    try:
+        for path, data, info in converter.iter_script_infos(args.qx_folder, args.recursive, args.subdir):
+            try:
+                body_script_path(info)
+            except NotCompilable as e:
+                report["skipped"][info.filename] = str(e)
+                continue
+            try:
+                report["compiled"][info.filename] = compile_body(converter.script_text(path, data)).summary()
+            except NotCompilable as e:
+                report["scripts"][info.filename] = str(e)
+    except ProviderError as e:
+        parser.error(str(e))
+    
+    for filename in report["compiled"]:
+        converter.log(f"Compiles to a native body rewrite: {filename}")
+    converter.log(f"{len(report['compiled'])} compiled, {len(report['scripts'])} stay scripts, "
+                  f"{len(report['skipped'])} not candidates")
+    write_json_report(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Long-running HTTP service converting QuantumultX scripts on demand
+
+    POST /convert?target=surge&name=foo      body: script text
+    GET  /convert?target=loon&url=https://...  fetch a script and convert it
+    GET  /metrics                            latency, cache and fetch statistics
+    GET  /healthz
+
+Without target the response is a JSON object with every target. Conversions
+are cached in a bounded LRU keyed by the script's content hash and the
+converter version, so a subscription link is served from memory until the
+script changes.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import urllib.request
+from collections import OrderedDict, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from script_converter import ScriptConverter, EMITTERS, CONVERTER_VERSION, percentile
+
+# Content types of the generated modules
+CONTENT_TYPES = {"stash": "text/yaml; charset=utf-8"}
+DEFAULT_CONTENT_TYPE = "text/plain; charset=utf-8"
+
+class LRUCache:
+    """Thread-safe mapping that drops the least recently used entry beyond max_entries"""
+    
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class LatencyRecorder:
+    """Request counts and latency percentiles over the most recent samples, per endpoint"""
+    
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+    
+    def record(self, endpoint, seconds, failed=False):
+        with self.lock:
+            self.samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            if failed:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+    
+    def stats(self):
+        with self.lock:
+            report = {}
+            for endpoint, samples in self.samples.items():
+                values = sorted(samples)
+                report[endpoint] = {
+                    "requests": self.counts[endpoint],
+                    "errors": self.errors.get(endpoint, 0),
+                    "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+                    "p90_ms": round(percentile(values, 0.90) * 1000, 3),
+                    "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+                    "max_ms": round(values[-1] * 1000, 3)
+                }
+            return report
+
+class ServiceError(Exception):
+    """Request failure carrying the HTTP status to answer with"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ConversionService:
+    """Cached conversions and script fetching shared by every request thread"""
+    
+    def __init__(self, cache_size=512, fetch_ttl=300.0, fetch_timeout=10.0, max_script_bytes=2 * 1024 * 1024):
+        self.cache = LRUCache(cache_size)
+        # url -> (fetched at, text); short-lived so edited scripts show up
+        self.fetched = LRUCache(cache_size)
+        self.fetch_ttl = fetch_ttl
+        self.fetch_timeout = fetch_timeout
+        self.max_script_bytes = max_script_bytes
+        self.latency = LatencyRecorder()
+        self.started = time.time()
+        self.local = threading.local()
+    
+    def converter(self):
+        """ScriptConverter of the calling thread"""
+        converter = getattr(self.local, "converter", None)
+        if converter is None:
+            converter = self.local.converter = ScriptConverter()
+        return converter
+    
+    def convert(self, text, targets, scriptname):
+        """{target: module text}, from the cache when this exact script was converted before"""
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        key = (digest, CONVERTER_VERSION, tuple(targets), scriptname)
+        outputs = self.cache.get(key)
+        if outputs is None:
+            outputs = self.converter().convert(text, targets, scriptname)
+            self.cache.put(key, outputs)
+        return outputs
+    
+    def fetch(self, url):
+        """Script text at url, reusing a recent download"""
+        if urlsplit(url).scheme not in ("http", "https"):
+            raise ServiceError(400, "url must be http or https")
+        
+        cached = self.fetched.get(url)
+        if cached is not None and time.monotonic() - cached[0] < self.fetch_ttl:
+            return cached[1]
+        
+        request = urllib.request.Request(url, headers={"User-Agent": f"script-converter/{CONVERTER_VERSION}"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.fetch_timeout) as response:
+                data = response.read(self.max_script_bytes + 1)
+        except OSError as e:
+            raise ServiceError(502, f"could not fetch {url}: {e}")
+        if len(data) > self.max_script_bytes:
+            raise ServiceError(413, f"script larger than {self.max_script_bytes} bytes")
+        
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            text = data.decode('latin-1')
+        self.fetched.put(url, (time.monotonic(), text))
+        return text
+    
+    def metrics(self):
+        return {
+            "converter_version": CONVERTER_VERSION,
+            "uptime_s": round(time.time() - self.started, 1),
+            "endpoints": self.latency.stats(),
+            "cache": self.cache.stats(),
+            "fetch_cache": self.fetched.stats()
+        }
+
+def script_name(params, url=None):
+    """Name used when a script has no #!name: the name parameter or the URL's file name"""
+    if params.get("name"):
+        return params["name"]
+    if url:
+        base = os.path.basename(urlsplit(url).path)
+        if base:
+            return os.path.splitext(base)[0]
+    return "script"
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """Routes requests to the ConversionService stored on the server"""
+    
+    server_version = f"ScriptConverter/{CONVERTER_VERSION}"
+    protocol_version = "HTTP/1.1"
+    
+    def do_GET(self):
+        self.handle_request("GET")
+    
+    def do_POST(self):
+        self.handle_request("POST")
+    
+    def handle_request(self, method):
+        service = self.server.service
+        started = time.perf_counter()
+        parts = urlsplit(self.path)
+        endpoint = f"{method} {parts.path}"
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        failed = False
+        try:
+            # The body is read before anything can fail, so an error never leaves it in the stream
+            body = self.read_body()
+            if parts.path == "/convert":
+                self.handle_convert(method, params, body)
+            elif parts.path == "/metrics" and method == "GET":
+                self.send_json(200, service.metrics())
+            elif parts.path == "/healthz" and method == "GET":
+                self.send_body(200, b"ok\n", DEFAULT_CONTENT_TYPE)
+            else:
+                endpoint = "other"
+                raise ServiceError(404, "not found")
+        except ServiceError as e:
+            failed = True
+            self.send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            failed = True
+            self.close_connection = True
+            self.log_error("conversion failed: %s", e)
+            self.send_json(500, {"error": "conversion failed"})
+        finally:
+            service.latency.record(endpoint, time.perf_counter() - started, failed)
+    
+    def read_body(self):
+        """Request body; a body whose end cannot be found or that is too large closes the connection"""
+        service = self.server.service
+        if "Transfer-Encoding" in self.headers:
+            # Chunked uploads are not decoded; their chunks must not be read as the next request
+            self.close_connection = True
+            raise ServiceError(411, "send the script with a Content-Length")
+        header = self.headers.get("Content-Length")
+        if header is None:
+            return b""
+        try:
+            length = int(header)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Where the body ends is unknown, so nothing after it can be trusted as a request
+            self.close_connection = True
+            raise ServiceError(400, "invalid Content-Length")
+        if length > service.max_script_bytes:
+            self.close_connection = True
+            raise ServiceError(413, f"script larger than {service.max_script_bytes} bytes")
+        return self.rfile.read(length)
+    
+    def handle_convert(self, method, params, body):
+        service = self.server.service
+        targets = [target.strip().lower() for target in params.get("target", "").split(',') if target.strip()]
+        targets = targets or list(EMITTERS)
+        unknown = [target for target in targets if target not in EMITTERS]
+        if unknown:
+            raise ServiceError(400, f"unknown target(s): {', '.join(unknown)}")
+        
+        if method == "POST":
+            if not body:
+                raise ServiceError(400, "empty script")
+            text = body.decode('utf-8', errors='replace')
+            name = script_name(params)
+        elif params.get("url"):
+            text = service.fetch(params["url"])
+            name = script_name(params, params["url"])
+        else:
+            raise ServiceError(400, "POST a script or pass ?url=")
+        
+        outputs = service.convert(text, targets, name)
+        if len(targets) == 1:
+            self.send_body(200, outputs[targets[0]].encode('utf-8'),
+                           CONTENT_TYPES.get(targets[0], DEFAULT_CONTENT_TYPE))
+        else:
+            self.send_json(200, outputs)
+    
+    def send_json(self, status, data):
+        body = (json.dumps(data, ensure_ascii=False, indent=2) + "\n").encode('utf-8')
+        self.send_body(status, body, "application/json; charset=utf-8")
+    
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def create_server(host, port, service, verbose=False):
+    """Threaded HTTP server bound to host:port, one thread per connection"""
+    server = ThreadingHTTPServer((host, port), ConversionHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Serve QuantumultX script conversions over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument("--cache-size", type=int, default=512,
+                        help="conversions kept in the LRU cache (default: 512)")
+    parser.add_argument("--fetch-ttl", type=float, default=300.0,
+                        help="seconds a fetched script is reused (default: 300)")
+    parser.add_argument("--fetch-timeout", type=float, default=10.0,
+                        help="seconds before fetching a script fails (default: 10)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+    
+    service = ConversionService(max(1, args.cache_size), args.fetch_ttl, args.fetch_timeout)
+    server = create_server(args.host, args.port, service, args.verbose)
+    print(f"Serving conversions on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Find QuantumultX scripts whose rules duplicate or contain each other
+
+Every parsed rule, rewrite and script entry is reduced to a content address
+(Entry.digest), so a script is a set of digests. Scripts with the same set are
+identical variants; a script whose set sits inside another's adds nothing the
+larger one doesn't already do.
+"""
+
+import argparse
+
+from script_converter import ScriptConverter, add_source_arguments, write_json_report
+from input_providers import ProviderError
+
+class DedupIndex:
+    """Entry digests of every script with an inverted index from digest to scripts"""
+    
+    def __init__(self):
+        self.modules = {}
+        self.postings = {}
+        self.entry_count = 0
+    
+    def add(self, name, info):
+        """Record the entries of one parsed script"""
+        digests = frozenset(entry.digest() for entry in info.rules + info.rewrites + info.scripts)
+        self.entry_count += len(info.rules) + len(info.rewrites) + len(info.scripts)
+        self.modules[name] = digests
+        for digest in digests:
+            self.postings.setdefault(digest, set()).add(name)
+    
+    def identical(self):
+        """Groups of scripts with the same non-empty entry set"""
+        groups = {}
+        for name, digests in self.modules.items():
+            if digests:
+                groups.setdefault(digests, []).append(name)
+        return sorted(sorted(names) for names in groups.values() if len(names) > 1)
+    
+    def supersets(self, name):
+        """Scripts whose entries strictly contain those of name"""
+        digests = self.modules[name]
+        if not digests:
+            return []
+        
+        # Intersect posting lists from the rarest entry up, stopping once only name is left
+        candidates = None
+        for digest in sorted(digests, key=lambda digest: len(self.postings[digest])):
+            postings = self.postings[digest]
+            candidates = set(postings) if candidates is None else candidates & postings
+            if len(candidates) <= 1:
+                break
+        return sorted(other for other in candidates
+                      if other != name and len(self.modules[other]) > len(digests) and digests < self.modules[other])
+    
+    def report(self):
+        """JSON-serializable summary of duplicated and contained scripts"""
+        subsets = []
+        for name in sorted(self.modules):
+            contained_in = self.supersets(name)
+            if contained_in:
+                subsets.append({"module": name, "entries": len(self.modules[name]), "contained_in": contained_in})
+        
+        shared = {digest: sorted(names) for digest, names in self.postings.items() if len(names) > 1}
+        return {
+            "modules": len(self.modules),
+            "entries": self.entry_count,
+            "unique_entries": len(self.postings),
+            "identical": self.identical(),
+            "subsets": subsets,
+            "shared_entries": len(shared),
+            "most_shared": sorted(({"digest": digest, "modules": names} for digest, names in shared.items()),
+                                  key=lambda item: (-len(item["modules"]), item["digest"]))[:20]
+        }
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Report QuantumultX scripts with identical or contained rule sets")
+    add_source_arguments(parser)
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    
+    converter = ScriptConverter()
+    index = DedupIndex()
+    try:
+        for _, _, info in converter.iter_script_infos(args.qx_folder, args.recursive, args.subdir):
+            index.add(info.filename, info)
+    except ProviderError as e:
+        parser.error(str(e))
+    
+    report = index.report()
+    for group in report["identical"]:
+        converter.log(f"Identical entries: {', '.join(group)}")
+    for item in report["subsets"]:
+        converter.log(f"{item['module']} is contained in {', '.join(item['contained_in'])}")
+    
+    write_json_report(report, args.output)
+    if args.output:
+        converter.log(f"{report['entries']} entries of {report['modules']} modules, "
+                      f"{report['unique_entries']} unique, report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
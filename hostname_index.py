@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""MITM hostname normalization and minimization on a reversed-label trie
+
+A wildcard entry such as *.example.com already makes the client intercept
+every subdomain, so api.example.com or *.cdn.example.com next to it are
+redundant. WildcardTrie stores wildcards label by label from the TLD down,
+which turns "is this host covered by a wildcard" into one walk over its labels.
+"""
+
+import re
+import argparse
+
+# Hostnames the trie understands; anything else is kept verbatim and only deduplicated
+HOST_RE = re.compile(r'^(?!-)[a-z0-9*?_-]+(?:\.[a-z0-9*?_-]+)*$')
+
+# Module-level directives some sources paste into hostname lines
+HOST_DIRECTIVES = ("%APPEND%", "%INSERT%")
+
+# Trie node key marking a wildcard; labels are strings so it can't collide
+WILDCARD = 0
+
+def normalize_host(raw):
+    """Lower-cased host without quotes, directives or a trailing dot, "" when empty"""
+    host = raw.strip().strip('"\'').strip()
+    for directive in HOST_DIRECTIVES:
+        if host.upper().startswith(directive):
+            host = host[len(directive):].strip()
+    return host.lower().rstrip('.')
+
+def split_hostnames(value):
+    """Normalized, non-empty entries of a comma separated hostname value"""
+    hosts = []
+    for raw in value.split(','):
+        host = normalize_host(raw)
+        if host:
+            hosts.append(host)
+    return hosts
+
+def is_plain(host):
+    """True for hosts the trie can reason about: no port, exclusion or odd characters"""
+    return HOST_RE.match(host) is not None
+
+class WildcardTrie:
+    """Wildcard hostnames (*.example.com) keyed by reversed labels
+    
+    Only wildcards can cover other entries, so exact hosts never enter the trie.
+    """
+    
+    def __init__(self):
+        self.root = {}
+        self.match_all = False
+    
+    def add(self, host):
+        """Insert a plain wildcard host such as *.example.com, or * for everything"""
+        if host == "*":
+            self.match_all = True
+            return
+        
+        node = self.root
+        for label in reversed(host[2:].split('.')):
+            node = node.setdefault(label, {})
+        node[WILDCARD] = True
+    
+    def covered(self, host):
+        """True if a wildcard other than host itself already matches host
+        
+        *.example.com covers a.example.com, a.b.example.com and *.b.example.com,
+        but not example.com itself.
+        """
+        if self.match_all:
+            return host != "*"
+        
+        # Every proper suffix of the labels is a candidate wildcard parent
+        labels = host.split('.')
+        node = self.root
+        for label in reversed(labels[2 if labels[0] == "*" else 1:]):
+            node = node.get(label)
+            if node is None:
+                return False
+            if WILDCARD in node:
+                return True
+        return False
+
+def minimize_hostnames(hosts):
+    """Deduplicate hosts and drop those covered by a wildcard, keeping first-seen order
+    
+    Returns (kept, dropped) where dropped maps each removed host to "duplicate" or "covered".
+    """
+    unique = list(dict.fromkeys(hosts))
+    dropped = {}
+    if len(unique) != len(hosts):
+        seen = set()
+        for host in hosts:
+            if host in seen:
+                dropped[host] = "duplicate"
+            seen.add(host)
+    
+    trie = WildcardTrie()
+    for host in unique:
+        if host[0] == "*" and (host == "*" or host[1] == ".") and is_plain(host):
+            trie.add(host)
+    if not trie.root and not trie.match_all:
+        return unique, dropped
+    
+    kept = []
+    for host in unique:
+        if is_plain(host) and trie.covered(host):
+            dropped[host] = "covered"
+        else:
+            kept.append(host)
+    return kept, dropped
+
+def reversed_key(host):
+    """Sort key grouping hosts by domain: com.example.api"""
+    return host.split('.')[::-1]
+
+class HostnameIndex:
+    """Hostnames of every module plus the corpus-wide minimal MITM list"""
+    
+    def __init__(self):
+        self.modules = {}
+        self.owners = {}
+    
+    def add_module(self, name, hosts, source="mitm", dropped=None):
+        """Record the hostnames of one module; source is how the converter found them
+        
+        dropped lists entries already removed before hosts was built.
+        """
+        kept, removed = minimize_hostnames(hosts)
+        dropped = {**(dropped or {}), **removed}
+        self.modules[name] = {"hostnames": kept, "dropped": dropped, "source": source}
+        for host in kept:
+            self.owners.setdefault(host, []).append(name)
+    
+    def guessed(self):
+        """Modules whose hostnames came from a URL guess or the default"""
+        return sorted(name for name, module in self.modules.items() if module["source"] in ("guess", "default"))
+    
+    def minimal(self):
+        """Smallest hostname list covering every module, grouped by domain"""
+        kept, _ = minimize_hostnames(list(self.owners))
+        return sorted(kept, key=reversed_key)
+    
+    def modules_for(self, host):
+        """Modules intercepting host, directly or through a wildcard"""
+        host = normalize_host(host)
+        names = set(self.owners.get(host, ()))
+        labels = host.split('.')
+        for i in range(1, len(labels)):
+            names.update(self.owners.get("*." + ".".join(labels[i:]), ()))
+        names.update(self.owners.get("*", ()))
+        return sorted(names)
+    
+    def report(self):
+        """JSON-serializable summary of the index"""
+        minimal = self.minimal()
+        return {
+            "modules": len(self.modules),
+            "hostnames": len(self.owners),
+            "minimal_count": len(minimal),
+            "guessed": self.guessed(),
+            "minimal": minimal,
+            "per_module": self.modules
+        }
+
+def main():
+    """Main function"""
+    # Imported here because the converter itself imports this module
+    from script_converter import ScriptConverter, add_source_arguments, write_json_report
+    from input_providers import ProviderError
+    
+    parser = argparse.ArgumentParser(description="Build a minimal MITM hostname index of QuantumultX scripts")
+    add_source_arguments(parser)
+    parser.add_argument("-o", "--output", help="write the JSON index here instead of stdout")
+    parser.add_argument("--line", action="store_true",
+                        help="print only the corpus-wide 'hostname = ...' line")
+    parser.add_argument("--lookup", metavar="HOST", help="list the modules intercepting HOST")
+    args = parser.parse_args()
+    
+    converter = ScriptConverter()
+    index = HostnameIndex()
+    try:
+        for _, _, info in converter.iter_script_infos(args.qx_folder, args.recursive, args.subdir):
+            index.add_module(info.filename, split_hostnames(info.hostname), info.hostname_source,
+                             info.hostname_dropped)
+    except ProviderError as e:
+        parser.error(str(e))
+    
+    if args.lookup:
+        for name in index.modules_for(args.lookup):
+            print(name)
+        return
+    
+    if args.line:
+        print(f"hostname = {', '.join(index.minimal())}")
+        return
+    
+    report = index.report()
+    for name in report["guessed"]:
+        converter.log(f"Hostname of {name} is a {index.modules[name]['source']}, not from the script", "WARN")
+    
+    write_json_report(report, args.output)
+    if args.output:
+        converter.log(f"{report['hostnames']} hostnames of {report['modules']} modules "
+                      f"reduced to {report['minimal_count']}, written to {args.output}")
+
+if __name__ == "__main__":
+    main()
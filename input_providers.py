@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Script sources other than a flat folder: directory trees, archives and git objects
+
+Every provider yields ScriptSource records holding the script bytes, read
+straight from the archive member or git blob, so ScriptConverter.process_sources
+runs the usual parse/emit pipeline without extracting anything to disk.
+
+    path/to/folder                 recursive directory walk
+    bundle.tar.gz, bundle.zip      archive members
+    git:REPO@REF                   every script in the tree at REF
+    git:REPO@BASE..REF             only scripts added or changed between BASE and REF
+"""
+
+import os
+import sys
+import zipfile
+import tarfile
+import argparse
+import subprocess
+
+SCRIPT_EXTENSION = ".js"
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+ZIP_SUFFIXES = (".zip",)
+GIT_PREFIX = "git:"
+
+class ProviderError(Exception):
+    """A source that cannot be opened or read"""
+
+class ScriptSource:
+    """One script: its path inside the provider and its raw bytes"""
+    __slots__ = ("name", "data")
+    
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+    
+    @property
+    def filename(self):
+        return os.path.basename(self.name)
+    
+    def __repr__(self):
+        return f"ScriptSource({self.name!r}, {len(self.data)} bytes)"
+
+def is_script(name):
+    return name.endswith(SCRIPT_EXTENSION) and not os.path.basename(name).startswith('.')
+
+class Provider:
+    """Base class; complete is False when only part of the source set is listed"""
+    
+    complete = True
+    
+    def __init__(self):
+        # File names of scripts known to be gone, for providers that are not complete
+        self.deleted = []
+    
+    def sources(self):
+        raise NotImplementedError
+    
+    def describe(self):
+        raise NotImplementedError
+
+def iter_script_paths(directory, recursive=False):
+    """Sorted script paths in directory, descending into subfolders when recursive"""
+    if not recursive:
+        with os.scandir(directory) as entries:
+            return sorted(entry.path for entry in entries if is_script(entry.name) and entry.is_file())
+    
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        # Skip hidden folders such as .git
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        paths.extend(os.path.join(root, name) for name in files if is_script(name))
+    return sorted(paths)
+
+class DirectoryProvider(Provider):
+    def __init__(self, directory, recursive=True):
+        super().__init__()
+        self.directory = directory
+        self.recursive = recursive
+    
+    def sources(self):
+        for path in iter_script_paths(self.directory, self.recursive):
+            with open(path, 'rb') as file:
+                yield ScriptSource(os.path.relpath(path, self.directory), file.read())
+    
+    def describe(self):
+        return f"directory {self.directory}"
+
+class TarProvider(Provider):
+    """Members of a tar archive, read in archive order from a single forward pass"""
+    
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+    
+    def sources(self):
+        try:
+            # Stream mode never seeks, so compressed archives are decompressed once
+            with tarfile.open(self.path, "r|*") as archive:
+                for member in archive:
+                    if member.isfile() and is_script(member.name):
+                        yield ScriptSource(member.name, archive.extractfile(member).read())
+        except (OSError, tarfile.TarError) as e:
+            raise ProviderError(f"cannot read {self.path}: {e}")
+    
+    def describe(self):
+        return f"tar archive {self.path}"
+
+class ZipProvider(Provider):
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+    
+    def sources(self):
+        try:
+            with zipfile.ZipFile(self.path) as archive:
+                members = sorted((info for info in archive.infolist()
+                                  if not info.is_dir() and is_script(info.filename)),
+                                 key=lambda info: info.filename)
+                for info in members:
+                    yield ScriptSource(info.filename, archive.read(info))
+        except (OSError, zipfile.BadZipFile) as e:
+            raise ProviderError(f"cannot read {self.path}: {e}")
+    
+    def describe(self):
+        return f"zip archive {self.path}"
+
+class GitProvider(Provider):
+    """Blobs of a git tree, or of the scripts changed between two commits
+    
+    Object ids come from ls-tree or diff-tree; their contents are streamed
+    through one long-running git cat-file --batch process.
+    """
+    
+    def __init__(self, repo, ref, base=None, subdir=""):
+        super().__init__()
+        self.repo = repo
+        self.ref = ref
+        self.base = base
+        self.subdir = subdir.strip('/')
+        self.complete = base is None
+    
+    def git(self, *args):
+        try:
+            return subprocess.run(["git", "-C", self.repo, *args], check=True,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+        except FileNotFoundError:
+            raise ProviderError("git is not installed")
+        except subprocess.CalledProcessError as e:
+            raise ProviderError(f"git {' '.join(args)} failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+    
+    def pathspec(self):
+        return ["--", self.subdir] if self.subdir else []
+    
+    def list_tree(self):
+        """[(path, blob id)] of every script at ref"""
+        blobs = []
+        output = self.git("ls-tree", "-r", "-z", "--full-tree", self.ref, *self.pathspec())
+        for record in output.split(b'\0'):
+            if not record:
+                continue
+            meta, _, path = record.partition(b'\t')
+            _, kind, oid = meta.split()
+            path = path.decode('utf-8', 'surrogateescape')
+            if kind == b"blob" and is_script(path):
+                blobs.append((path, oid.decode('ascii')))
+        return blobs
+    
+    def list_changes(self):
+        """[(path, blob id)] of scripts added or modified since base; deletions go to self.deleted"""
+        blobs = []
+        output = self.git("diff-tree", "-r", "-z", "--no-renames", self.base, self.ref, *self.pathspec())
+        fields = output.split(b'\0')
+        # Raw records are ":mode mode oid oid status" followed by the path
+        for meta, path in zip(fields[0::2], fields[1::2]):
+            if not meta.startswith(b':'):
+                continue
+            _, _, _, new_oid, status = meta[1:].split()
+            path = path.decode('utf-8', 'surrogateescape')
+            if not is_script(path):
+                continue
+            if status == b"D":
+                self.deleted.append(os.path.basename(path))
+            else:
+                blobs.append((path, new_oid.decode('ascii')))
+        return blobs
+    
+    def sources(self):
+        blobs = self.list_tree() if self.base is None else self.list_changes()
+        if not blobs:
+            return
+        try:
+            process = subprocess.Popen(["git", "-C", self.repo, "cat-file", "--batch"],
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except FileNotFoundError:
+            raise ProviderError("git is not installed")
+        try:
+            for path, oid in blobs:
+                # One request at a time keeps both pipes from filling up
+                process.stdin.write(oid.encode('ascii') + b"\n")
+                process.stdin.flush()
+                header = process.stdout.readline().split()
+                if len(header) != 3 or header[1] != b"blob":
+                    raise ProviderError(f"git cat-file could not read {path} ({oid})")
+                data = process.stdout.read(int(header[2]))
+                process.stdout.read(1)
+                yield ScriptSource(path, data)
+        finally:
+            process.stdin.close()
+            process.stdout.close()
+            process.wait()
+    
+    def describe(self):
+        refs = f"{self.base}..{self.ref}" if self.base else self.ref
+        return f"git {self.repo} at {refs}"
+
+def parse_git_spec(spec):
+    """(repo, ref, base) from REPO@REF or REPO@BASE..REF"""
+    repo, sep, refs = spec.rpartition('@')
+    if not sep:
+        repo, refs = spec, "HEAD"
+    base, sep, ref = refs.partition('..')
+    if not sep:
+        base, ref = None, refs
+    return repo or ".", ref or "HEAD", base or None
+
+def open_provider(spec, recursive=True, subdir=""):
+    """Provider for a directory, archive path or git:REPO@REF[..REF] spec"""
+    if spec.startswith(GIT_PREFIX):
+        repo, ref, base = parse_git_spec(spec[len(GIT_PREFIX):])
+        return GitProvider(repo, ref, base, subdir)
+    if os.path.isdir(spec):
+        return DirectoryProvider(os.path.join(spec, subdir) if subdir else spec, recursive)
+    lowered = spec.lower()
+    if lowered.endswith(ZIP_SUFFIXES):
+        return ZipProvider(spec)
+    if lowered.endswith(TAR_SUFFIXES):
+        return TarProvider(spec)
+    raise ProviderError(f"not a directory, archive or git:REPO@REF spec: {spec}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="List the scripts an input source provides")
+    parser.add_argument("source", help="directory, .tar[.gz|.bz2|.xz]/.zip archive, or git:REPO@REF[..REF]")
+    parser.add_argument("--subdir", default="", help="only scripts below this path of a git tree or directory")
+    args = parser.parse_args()
+    
+    try:
+        provider = open_provider(args.source, subdir=args.subdir)
+        count = 0
+        for source in provider.sources():
+            print(f"{len(source.data):8d}  {source.name}")
+            count += 1
+    except ProviderError as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+    for filename in provider.deleted:
+        print(f"{'deleted':>8}  {filename}")
+    print(f"{count} scripts from {provider.describe()}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
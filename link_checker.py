@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Check that the script-path and icon URLs referenced by generated modules exist
+
+All URLs of a folder are checked in one asyncio run over a bounded pool of
+keep-alive connections. Validators (ETag, Last-Modified) of every reachable URL
+are kept in an on-disk cache and sent back as If-None-Match/If-Modified-Since,
+so a repeat run mostly costs one 304 per URL.
+"""
+
+import os
+import ssl
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit, urljoin
+
+from script_converter import ScriptConverter, CONVERTER_VERSION, add_source_arguments, write_json_report
+from input_providers import ProviderError
+
+LINK_CACHE_FILE = ".link_cache.json"
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+# HEAD answers of servers that only implement GET
+HEAD_UNSUPPORTED = (405, 501)
+USER_AGENT = f"script-converter-linkcheck/{CONVERTER_VERSION}"
+
+class LinkError(Exception):
+    """Network or protocol failure while checking a URL"""
+
+class ConnectionDropped(OSError):
+    """The server closed the connection before any byte of the response"""
+
+def collect_links(converter, source, recursive=False, subdir=""):
+    """{url: [(module, kind), ...]} of every icon and script-path of a folder, archive or git spec"""
+    links = {}
+    for _, _, info in converter.iter_script_infos(source, recursive, subdir):
+        module = os.path.splitext(info.filename)[0]
+        icon = info.metadata.get("icon", "").strip()
+        if icon:
+            links.setdefault(icon, []).append((module, "icon"))
+        for script in info.scripts:
+            if script.script_path:
+                links.setdefault(script.script_path.strip(), []).append((module, "script-path"))
+    return links
+
+def parse_rewrites(values):
+    """[(old prefix, new prefix)] from OLD=NEW arguments"""
+    rewrites = []
+    for value in values:
+        old, sep, new = value.partition('=')
+        if not sep or not old:
+            raise ValueError(f"expected OLD=NEW, got {value!r}")
+        rewrites.append((old, new))
+    return rewrites
+
+def rewrite_url(url, rewrites):
+    """url with the first matching prefix replaced"""
+    for old, new in rewrites:
+        if url.startswith(old):
+            return new + url[len(old):]
+    return url
+
+class Response:
+    __slots__ = ("status", "headers")
+    
+    def __init__(self, status, headers):
+        self.status = status
+        self.headers = headers
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections, at most `limit` open in total and `per_host` per origin
+    
+    Idle connections count against the limit: opening a new one first closes
+    the longest idle connection of any origin once `limit` are open.
+    """
+    
+    def __init__(self, limit=16, per_host=4, timeout=10.0):
+        self.timeout = timeout
+        self.limit = limit
+        self.slots = asyncio.Semaphore(limit)
+        self.per_host = per_host
+        self.host_slots = {}
+        self.idle = {}
+        self.ssl_context = ssl.create_default_context()
+        self.open = 0
+        self.opened = 0
+        self.reused = 0
+    
+    def origin(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise LinkError(f"unsupported URL {url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return parts.scheme, parts.hostname, port
+    
+    async def connect(self, origin, fresh=False):
+        """(reader, writer, reused): an idle keep-alive connection unless fresh, else a new one"""
+        idle = None if fresh else self.idle.get(origin)
+        while idle:
+            _, reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                self.reused += 1
+                return reader, writer, True
+            self.discard(writer)
+        
+        # Requests in flight stay below limit, so an idle connection is left to close
+        while self.open >= self.limit and self.close_oldest_idle():
+            pass
+        
+        scheme, host, port = origin
+        self.open += 1
+        self.opened += 1
+        try:
+            reader, writer = await asyncio.open_connection(host, port,
+                                                           ssl=self.ssl_context if scheme == "https" else None,
+                                                           server_hostname=host if scheme == "https" else None)
+        except BaseException:
+            self.open -= 1
+            raise
+        return reader, writer, False
+    
+    def close_oldest_idle(self):
+        """Close the longest idle connection of any origin, False when none is idle"""
+        oldest = None
+        for origin, connections in self.idle.items():
+            if connections and (oldest is None or connections[0][0] < self.idle[oldest][0][0]):
+                oldest = origin
+        if oldest is None:
+            return False
+        self.discard(self.idle[oldest].pop(0)[2])
+        return True
+    
+    def discard(self, writer):
+        writer.close()
+        self.open -= 1
+    
+    def release(self, origin, connection, reusable):
+        if reusable:
+            self.idle.setdefault(origin, []).append((time.monotonic(), *connection))
+        else:
+            self.discard(connection[1])
+    
+    async def request(self, method, url, headers):
+        """Send one request, returning its Response; the body is read and discarded"""
+        origin = self.origin(url)
+        parts = urlsplit(url)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        host_header = parts.netloc.rsplit('@', 1)[-1]
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {host_header}", f"User-Agent: {USER_AGENT}",
+                 "Accept: */*", "Accept-Encoding: identity"]
+        lines += [f"{key}: {value}" for key, value in headers.items()]
+        payload = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+        
+        host_slots = self.host_slots.setdefault(origin, asyncio.Semaphore(self.per_host))
+        async with self.slots, host_slots:
+            # A reused connection the server already closed fails before the response starts;
+            # that one is retried on a fresh connection
+            for attempt in range(2):
+                connection = None
+                reused = False
+                try:
+                    reader, writer, reused = await asyncio.wait_for(self.connect(origin, fresh=attempt > 0),
+                                                                    self.timeout)
+                    connection = (reader, writer)
+                    writer.write(payload)
+                    response, reusable = await asyncio.wait_for(self.read_response(reader, method), self.timeout)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ValueError) as e:
+                    if connection is not None:
+                        self.discard(connection[1])
+                    if isinstance(e, ConnectionDropped) and reused:
+                        continue
+                    raise LinkError(str(e) or type(e).__name__)
+                self.release(origin, connection, reusable)
+                return response
+    
+    async def read_response(self, reader, method):
+        try:
+            status_line = await reader.readuntil(b"\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise
+            raise ConnectionDropped("connection closed before the response")
+        except (ConnectionResetError, BrokenPipeError):
+            raise ConnectionDropped("connection reset before the response")
+        status_line = status_line.decode('latin-1').split(' ', 2)
+        if len(status_line) < 2 or not status_line[0].startswith("HTTP/"):
+            raise ValueError(f"malformed status line {' '.join(status_line).strip()!r}")
+        status = int(status_line[1])
+        headers = {}
+        while True:
+            line = (await reader.readuntil(b"\r\n")).decode('latin-1')
+            if line == "\r\n":
+                break
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+        
+        reusable = headers.get("connection", "").lower() != "close" and status_line[0] != "HTTP/1.0"
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            return Response(status, headers), reusable
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif "content-length" in headers:
+            await reader.readexactly(int(headers["content-length"]))
+        else:
+            # Body runs until the server closes the connection
+            await reader.read()
+            reusable = False
+        return Response(status, headers), reusable
+    
+    def close(self):
+        for connections in self.idle.values():
+            for _, _, writer in connections:
+                self.discard(writer)
+        self.idle.clear()
+
+class LinkChecker:
+    """Checks URLs concurrently, revalidating against the on-disk cache"""
+    
+    def __init__(self, cache_path=LINK_CACHE_FILE, connections=16, per_host=4, timeout=10.0,
+                 max_age=0.0, rewrites=None):
+        self.cache_path = cache_path
+        self.cache = self.load_cache()
+        self.connections = connections
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_age = max_age
+        self.rewrites = rewrites or []
+        self.counts = {"fresh": 0, "not_modified": 0, "fetched": 0, "failed": 0}
+    
+    def load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_cache(self):
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp_path, self.cache_path)
+    
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+    
+    async def fetch(self, pool, url, headers):
+        """(Response, final URL) after following redirects; falls back to a 1-byte GET when HEAD is refused"""
+        method = "HEAD"
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await pool.request(method, url, headers)
+            if response.status in HEAD_UNSUPPORTED and method == "HEAD":
+                method = "GET"
+                headers = {**headers, "Range": "bytes=0-0"}
+                response = await pool.request(method, url, headers)
+            if response.status not in REDIRECT_STATUSES or "location" not in response.headers:
+                return response, url
+            url = urljoin(url, response.headers["location"])
+        raise LinkError(f"more than {MAX_REDIRECTS} redirects")
+    
+    async def check(self, pool, url):
+        """Result dict of one URL, updating its cache entry"""
+        entry = self.cache.get(url, {})
+        now = time.time()
+        if entry.get("ok") and now - entry.get("checked_at", 0) < self.max_age:
+            self.counts["fresh"] += 1
+            return {**entry, "cached": "fresh"}
+        
+        target = rewrite_url(url, self.rewrites)
+        headers = self.conditional_headers(entry) if entry.get("ok") else {}
+        try:
+            response, final_url = await self.fetch(pool, target, headers)
+        except LinkError as e:
+            self.counts["failed"] += 1
+            self.cache[url] = {"ok": False, "status": None, "error": str(e), "checked_at": now}
+            return self.cache[url]
+        
+        if response.status == 304:
+            self.counts["not_modified"] += 1
+            entry = {**entry, "checked_at": now}
+            self.cache[url] = entry
+            return {**entry, "cached": "not-modified"}
+        
+        self.counts["fetched"] += 1
+        ok = 200 <= response.status < 300
+        entry = {"ok": ok, "status": response.status, "checked_at": now}
+        if final_url != target:
+            entry["final_url"] = final_url
+        if ok:
+            if "etag" in response.headers:
+                entry["etag"] = response.headers["etag"]
+            if "last-modified" in response.headers:
+                entry["last_modified"] = response.headers["last-modified"]
+        self.cache[url] = entry
+        return entry
+    
+    async def check_all(self, urls):
+        """{url: result} of every URL, checked concurrently over one pool"""
+        pool = ConnectionPool(self.connections, self.per_host, self.timeout)
+        try:
+            # One misbehaving server fails its own URLs instead of aborting the run
+            results = await asyncio.gather(*(self.check(pool, url) for url in urls), return_exceptions=True)
+        finally:
+            pool.close()
+        self.pool_stats = {"opened": pool.opened, "reused": pool.reused}
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                self.counts["failed"] += 1
+                results[index] = self.cache[urls[index]] = {"ok": False, "status": None,
+                                                            "error": f"{type(result).__name__}: {result}",
+                                                            "checked_at": time.time()}
+            elif isinstance(result, BaseException):
+                raise result
+        return dict(zip(urls, results))
+    
+    def run(self, links):
+        """Check every URL of links and return the JSON-serializable report"""
+        started = time.perf_counter()
+        results = asyncio.run(self.check_all(sorted(links)))
+        self.save_cache()
+        
+        broken = []
+        for url, result in results.items():
+            if not result["ok"]:
+                broken.append({"url": url, "status": result.get("status"), "error": result.get("error"),
+                               "referenced_by": [{"module": module, "kind": kind} for module, kind in links[url]]})
+        return {
+            "urls": len(results),
+            "broken_count": len(broken),
+            "seconds": round(time.perf_counter() - started, 3),
+            "requests": self.counts,
+            "connections": self.pool_stats,
+            "broken": broken
+        }
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Check the icon and script-path URLs of QuantumultX scripts")
+    add_source_arguments(parser)
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--cache", default=LINK_CACHE_FILE,
+                        help=f"validator cache file, empty to disable (default: {LINK_CACHE_FILE})")
+    parser.add_argument("--max-age", type=float, default=0.0,
+                        help="seconds a successful check is trusted without revalidating (default: 0)")
+    parser.add_argument("-c", "--connections", type=int, default=16,
+                        help="maximum open connections (default: 16)")
+    parser.add_argument("--per-host", type=int, default=4,
+                        help="maximum open connections per host (default: 4)")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="seconds per connect and per response (default: 10)")
+    parser.add_argument("--rewrite-prefix", action="append", default=[], metavar="OLD=NEW",
+                        help="request URLs starting with OLD at NEW instead, e.g. to use a local mirror")
+    parser.add_argument("--fail", action="store_true", help="exit non-zero if any URL is broken")
+    args = parser.parse_args()
+    
+    try:
+        rewrites = parse_rewrites(args.rewrite_prefix)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    converter = ScriptConverter()
+    try:
+        links = collect_links(converter, args.qx_folder, args.recursive, args.subdir)
+    except ProviderError as e:
+        parser.error(str(e))
+    checker = LinkChecker(args.cache, max(1, args.connections), max(1, args.per_host), args.timeout,
+                          args.max_age, rewrites)
+    report = checker.run(links)
+    
+    for item in report["broken"]:
+        modules = ", ".join(sorted({ref["module"] for ref in item["referenced_by"]}))
+        converter.log(f"Broken {item['url']} ({item['status'] or item['error']}) used by {modules}", "WARN")
+    counts = report["requests"]
+    converter.log(f"{report['urls']} URLs checked in {report['seconds']}s: {report['broken_count']} broken, "
+                  f"{counts['not_modified']} not modified, {counts['fresh']} fresh in cache")
+    
+    write_json_report(report, args.output)
+    
+    if args.fail and report["broken"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Machine-readable catalog of converted modules, maintained by the converter
+
+The converter records one entry per source script as it converts it (see
+ScriptConverter.catalog_path), so the catalog follows the incremental build:
+unchanged scripts keep their entry, changed ones are replaced and deleted ones
+dropped. The JSON file carries by_hostname and by_category indexes for the
+site; the optional SQLite mirror is updated row by row for tooling.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+
+from hostname_index import normalize_host, split_hostnames
+
+def catalog_entry(info, outputs):
+    """Catalog entry of a parsed script and the output paths generated from it"""
+    metadata = info.metadata
+    return {
+        "name": metadata["name"],
+        "desc": metadata["desc"],
+        "category": metadata["category"],
+        "author": metadata["author"],
+        "icon": metadata["icon"],
+        "hostnames": split_hostnames(info.hostname),
+        "hostname_source": info.hostname_source,
+        "rules": len(info.rules),
+        "rewrites": len(info.rewrites),
+        "scripts": len(info.scripts),
+        "outputs": sorted(outputs)
+    }
+
+def host_keys(host):
+    """Catalog hostnames that would intercept host: itself, each parent wildcard and *"""
+    host = normalize_host(host)
+    labels = host.split('.')
+    return [host] + ["*." + ".".join(labels[i:]) for i in range(1, len(labels))] + ["*"]
+
+def lookup_host(by_hostname, host):
+    """Files of a by_hostname index intercepting host"""
+    files = set()
+    for key in host_keys(host):
+        files.update(by_hostname.get(key, ()))
+    return sorted(files)
+
+class ModuleCatalog:
+    """Catalog entries keyed by source file name, with hostname and category indexes"""
+    
+    def __init__(self, path, version, sqlite_path=None):
+        self.path = path
+        self.version = version
+        self.sqlite_path = sqlite_path
+        self.modules = {}
+        # Files changed or removed since the last save, for the SQLite mirror
+        self.dirty = set()
+        self.load()
+    
+    def load(self):
+        """Read the catalog, starting empty when missing or written by another converter version"""
+        self.modules = {}
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == self.version:
+            self.modules = data.get("modules", {})
+    
+    def __contains__(self, filename):
+        return filename in self.modules
+    
+    def update(self, filename, entry):
+        """Replace the entry of one source file"""
+        if self.modules.get(filename) != entry:
+            self.modules[filename] = entry
+            self.dirty.add(filename)
+    
+    def discard(self, filename):
+        """Drop the entry of one source file if present"""
+        if self.modules.pop(filename, None) is not None:
+            self.dirty.add(filename)
+    
+    def retain(self, filenames):
+        """Drop entries of sources not in filenames, returning how many were removed"""
+        removed = set(self.modules) - set(filenames)
+        for filename in removed:
+            del self.modules[filename]
+        self.dirty |= removed
+        return len(removed)
+    
+    def by_hostname(self):
+        """{hostname: [files]} over the hostnames as written in the scripts"""
+        index = {}
+        for filename, entry in self.modules.items():
+            for host in entry["hostnames"]:
+                index.setdefault(host, []).append(filename)
+        return {host: sorted(files) for host, files in sorted(index.items())}
+    
+    def by_category(self):
+        """{category: [files]}"""
+        index = {}
+        for filename, entry in self.modules.items():
+            index.setdefault(entry["category"], []).append(filename)
+        return {category: sorted(files) for category, files in sorted(index.items())}
+    
+    def modules_for_host(self, host):
+        """Files whose MITM list intercepts host, directly or through a wildcard"""
+        return lookup_host(self.by_hostname(), host)
+    
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "count": len(self.modules),
+            "modules": {filename: self.modules[filename] for filename in sorted(self.modules)},
+            "by_hostname": self.by_hostname(),
+            "by_category": self.by_category()
+        }
+    
+    def save(self):
+        """Write the JSON catalog atomically and bring the SQLite mirror up to date"""
+        data = (json.dumps(self.to_dict(), ensure_ascii=False, indent=2) + "\n").encode('utf-8')
+        try:
+            with open(self.path, 'rb') as file:
+                if file.read() == data:
+                    data = None
+        except OSError:
+            pass
+        if data is not None:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, self.path)
+        
+        if self.sqlite_path:
+            self.sync_sqlite()
+        self.dirty.clear()
+    
+    def sync_sqlite(self):
+        """Upsert changed entries and delete removed ones; rebuilds the database on a version change"""
+        connection = sqlite3.connect(self.sqlite_path)
+        try:
+            with connection:
+                connection.executescript("""
+                    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                    CREATE TABLE IF NOT EXISTS modules (
+                        file TEXT PRIMARY KEY, name TEXT, desc TEXT, category TEXT, author TEXT, icon TEXT,
+                        hostname_source TEXT, rules INTEGER, rewrites INTEGER, scripts INTEGER, outputs TEXT);
+                    CREATE TABLE IF NOT EXISTS hostnames (host TEXT, file TEXT, PRIMARY KEY (host, file));
+                    CREATE INDEX IF NOT EXISTS modules_category ON modules (category);
+                    CREATE INDEX IF NOT EXISTS hostnames_file ON hostnames (file);
+                """)
+                row = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                if row is None or row[0] != self.version:
+                    connection.execute("DELETE FROM modules")
+                    connection.execute("DELETE FROM hostnames")
+                    connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+                    changed = set(self.modules)
+                else:
+                    changed = self.dirty
+                
+                for filename in sorted(changed):
+                    connection.execute("DELETE FROM modules WHERE file = ?", (filename,))
+                    connection.execute("DELETE FROM hostnames WHERE file = ?", (filename,))
+                    entry = self.modules.get(filename)
+                    if entry is None:
+                        continue
+                    connection.execute("INSERT INTO modules VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                        filename, entry["name"], entry["desc"], entry["category"], entry["author"], entry["icon"],
+                        entry["hostname_source"], entry["rules"], entry["rewrites"], entry["scripts"],
+                        json.dumps(entry["outputs"])))
+                    connection.executemany("INSERT OR IGNORE INTO hostnames VALUES (?, ?)",
+                                           [(host, filename) for host in entry["hostnames"]])
+        finally:
+            connection.close()
+
+def query_sqlite(path, host=None, category=None):
+    """Files matching host and/or category, straight from the SQLite mirror"""
+    clauses, params = [], []
+    if host:
+        keys = host_keys(host)
+        clauses.append(f"file IN (SELECT file FROM hostnames WHERE host IN ({', '.join('?' * len(keys))}))")
+        params += keys
+    if category:
+        clauses.append("category = ?")
+        params.append(category)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    connection = sqlite3.connect(path)
+    try:
+        return [row[0] for row in connection.execute(f"SELECT file FROM modules{where} ORDER BY file", params)]
+    finally:
+        connection.close()
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Look up modules in the catalog written by script_converter.py --catalog")
+    parser.add_argument("catalog", help="catalog JSON file, or the SQLite mirror with --sqlite")
+    parser.add_argument("--host", help="list modules intercepting HOST")
+    parser.add_argument("--category", help="list modules in CATEGORY")
+    parser.add_argument("--categories", action="store_true", help="list categories with their module counts")
+    parser.add_argument("--sqlite", action="store_true", help="query the SQLite mirror instead of the JSON file")
+    args = parser.parse_args()
+    
+    if args.sqlite:
+        if args.categories:
+            parser.error("--categories needs the JSON catalog")
+        for filename in query_sqlite(args.catalog, args.host, args.category):
+            print(filename)
+        return
+    
+    with open(args.catalog, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    
+    if args.categories:
+        for category, files in data["by_category"].items():
+            print(f"{len(files):5d}  {category}")
+        return
+    
+    files = set(data["modules"])
+    if args.host:
+        files &= set(lookup_host(data["by_hostname"], args.host))
+    if args.category:
+        files &= set(data["by_category"].get(args.category, ()))
+    if not args.host and not args.category:
+        json.dump(data["modules"], sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    for filename in sorted(files):
+        entry = data["modules"][filename]
+        print(f"{filename}\t{entry['name']}\t{entry['category']}")
+
+if __name__ == "__main__":
+    main()
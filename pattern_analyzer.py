@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Cost analysis of the URL patterns the converter copies into generated modules
+
+Every rewrite, script and URL-REGEX pattern ends up running against each
+request that passes through the proxy. Patterns are checked structurally
+(nested unbounded quantifiers, unanchored leading .*) and timed against a URL
+corpus in separate processes, so a catastrophically backtracking pattern is
+killed at its timeout instead of hanging the analysis.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import multiprocessing
+from multiprocessing.connection import wait
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:
+    # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from script_converter import ScriptConverter, add_source_arguments, write_json_report
+from input_providers import ProviderError
+from hostname_index import split_hostnames
+
+REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+# Long inputs that make backtracking patterns blow up: runs of URL characters ending in a mismatch
+ADVERSARIAL_URLS = [
+    prefix + char * count + "\x00"
+    for prefix in ("", "https://a.com/")
+    for char in ("a", "/", ".", "0", "-", "=")
+    for count in (64, 1024, 8192)
+]
+
+# Paths appended to every corpus host
+SAMPLE_PATHS = ("/", "/api/v1/user/info?id=1024&token=abcdef", "/static/img/banner_750x1334.jpg",
+                "/v2/config/ad/splash?platform=ios&version=8.1.0")
+
+# Searches timed per URL; the fastest one counts, so scheduler and cache noise does not
+TIMING_SAMPLES = 5
+
+def collect_patterns(info):
+    """Yield (pattern, kind) for every regex pattern of a parsed script"""
+    for rule in info.rules:
+        if rule.pattern is not None and (rule.rule_type or "").strip().upper() == "URL-REGEX":
+            yield rule.pattern.strip(), "URL-REGEX"
+    for entry in info.rewrites:
+        if entry.pattern:
+            yield entry.pattern, "rewrite"
+    for entry in info.scripts:
+        if entry.pattern:
+            yield entry.pattern, "script"
+
+def structural_issues(pattern):
+    """Compile pattern and return (issues, error); each issue is {"severity", "check", "message"}"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError, OverflowError) as e:
+        return [], str(e)
+    
+    issues = []
+    
+    def walk(items, inside_unbounded):
+        for op, av in items:
+            if op in REPEATS:
+                low, high, sub = av
+                unbounded = high == sre_constants.MAXREPEAT
+                if unbounded and inside_unbounded:
+                    issues.append({"severity": "error", "check": "nested-quantifier",
+                                   "message": "unbounded quantifier inside another one can backtrack exponentially"})
+                    return
+                if unbounded and sub.getwidth()[0] == 0:
+                    # (.?)+ or (a|)* splits the same text into iterations in exponentially many ways
+                    issues.append({"severity": "error", "check": "nested-quantifier",
+                                   "message": "unbounded quantifier over a group that can match empty can backtrack exponentially"})
+                    return
+                walk(sub, inside_unbounded or unbounded)
+            elif op is sre_constants.SUBPATTERN:
+                walk(av[-1], inside_unbounded)
+            elif op is sre_constants.BRANCH:
+                for branch in av[1]:
+                    walk(branch, inside_unbounded)
+            elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                walk(av[1], inside_unbounded)
+            elif op is sre_constants.GROUPREF_EXISTS:
+                walk(av[1], inside_unbounded)
+                if av[2]:
+                    walk(av[2], inside_unbounded)
+    
+    walk(parsed, False)
+    
+    items = list(parsed)
+    anchored = bool(items) and items[0] == (sre_constants.AT, sre_constants.AT_BEGINNING)
+    if items and not anchored:
+        op, av = items[0]
+        if op in REPEATS and av[1] == sre_constants.MAXREPEAT and list(av[2]) == [(sre_constants.ANY, None)]:
+            issues.append({"severity": "warning", "check": "leading-wildcard",
+                           "message": "unanchored leading .* is retried at every position of the URL"})
+        else:
+            issues.append({"severity": "info", "check": "unanchored",
+                           "message": "pattern is not anchored with ^"})
+    return issues, None
+
+def literal_prefix(pattern):
+    """Literal text a pattern starts with, skipping ^ and optional characters like the s of https?"""
+    prefix = []
+    for op, av in sre_parse.parse(pattern):
+        if op is sre_constants.AT and av is sre_constants.AT_BEGINNING and not prefix:
+            continue
+        if op is sre_constants.LITERAL:
+            prefix.append(chr(av))
+        elif op in REPEATS and av[0] == 0:
+            continue
+        else:
+            break
+    return "".join(prefix)
+
+def time_pattern(pattern, urls):
+    """Mean and worst search time over urls, in microseconds
+    
+    The adversarial inputs are tried again behind the pattern's literal prefix,
+    so anchored patterns reach their quantifiers. Each URL is searched
+    TIMING_SAMPLES times and its fastest search is its cost.
+    """
+    regex = re.compile(pattern)
+    prefix = literal_prefix(pattern)
+    if prefix:
+        urls = urls + [prefix + url for url in ADVERSARIAL_URLS]
+    perf_counter = time.perf_counter
+    total = 0.0
+    worst = 0.0
+    for url in urls:
+        elapsed = None
+        for _ in range(TIMING_SAMPLES):
+            started = perf_counter()
+            regex.search(url)
+            sample = perf_counter() - started
+            if elapsed is None or sample < elapsed:
+                elapsed = sample
+        total += elapsed
+        if elapsed > worst:
+            worst = elapsed
+    return {"mean_us": round(total / max(1, len(urls)) * 1e6, 3), "max_us": round(worst * 1e6, 3)}
+
+def _timing_worker(connection, urls):
+    """Time patterns received over connection until None arrives"""
+    while True:
+        pattern = connection.recv()
+        if pattern is None:
+            return
+        try:
+            connection.send(time_pattern(pattern, urls))
+        except Exception as e:
+            connection.send({"error": str(e)})
+
+class TimingPool:
+    """Worker processes timing one pattern each, replaced when a pattern overruns its timeout
+    
+    A running re.search can't be interrupted from Python, so a worker stuck on a
+    backtracking pattern is terminated and a fresh one takes its place.
+    """
+    
+    def __init__(self, urls, jobs, timeout):
+        self.urls = urls
+        self.jobs = max(1, jobs)
+        self.timeout = timeout
+    
+    def start_worker(self):
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_timing_worker, args=(child, self.urls), daemon=True)
+        process.start()
+        child.close()
+        return {"process": process, "connection": parent, "pattern": None, "deadline": None}
+    
+    def run(self, patterns):
+        """Return {pattern: timing}; a timing is {"mean_us", "max_us"}, {"timeout": True} or {"error"}"""
+        results = {}
+        queue = list(reversed(patterns))
+        workers = [self.start_worker() for _ in range(min(self.jobs, len(patterns)))]
+        try:
+            while queue or any(worker["pattern"] is not None for worker in workers):
+                # Hand out work to idle workers
+                for worker in workers:
+                    if worker["pattern"] is None and queue:
+                        worker["pattern"] = queue.pop()
+                        worker["deadline"] = time.monotonic() + self.timeout
+                        worker["connection"].send(worker["pattern"])
+                
+                busy = [worker for worker in workers if worker["pattern"] is not None]
+                remaining = max(0.0, min(worker["deadline"] for worker in busy) - time.monotonic())
+                ready = wait([worker["connection"] for worker in busy], timeout=remaining)
+                
+                for index, worker in enumerate(workers):
+                    if worker["pattern"] is None:
+                        continue
+                    if worker["connection"] in ready:
+                        try:
+                            results[worker["pattern"]] = worker["connection"].recv()
+                        except EOFError:
+                            results[worker["pattern"]] = {"error": "worker exited"}
+                            self.stop_worker(worker)
+                            workers[index] = self.start_worker()
+                            continue
+                        worker["pattern"] = None
+                    elif time.monotonic() >= worker["deadline"]:
+                        results[worker["pattern"]] = {"timeout": True}
+                        self.stop_worker(worker)
+                        workers[index] = self.start_worker()
+        finally:
+            for worker in workers:
+                self.stop_worker(worker)
+        return results
+    
+    def stop_worker(self, worker):
+        if worker["process"].is_alive():
+            if worker["pattern"] is None:
+                try:
+                    worker["connection"].send(None)
+                    worker["process"].join(1)
+                except (OSError, ValueError):
+                    pass
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+                worker["process"].join()
+        worker["connection"].close()
+
+class PatternAnalyzer:
+    """Collect patterns from a folder of scripts, check and time them against a budget"""
+    
+    def __init__(self, budget_us=1000.0, timeout=2.0, jobs=None):
+        self.budget_us = budget_us
+        self.timeout = timeout
+        self.jobs = jobs or os.cpu_count() or 1
+        self.converter = ScriptConverter()
+        # pattern -> list of (module, kind)
+        self.patterns = {}
+        self.hostnames = set()
+    
+    def add_scripts(self, source, recursive=False, subdir=""):
+        """Parse every script of a folder, archive or git spec and record its patterns and hostnames"""
+        for _, _, info in self.converter.iter_script_infos(source, recursive, subdir):
+            for pattern, kind in collect_patterns(info):
+                self.patterns.setdefault(pattern, []).append((info.filename, kind))
+            if info.hostname_source in ("mitm", "header"):
+                self.hostnames.update(host for host in split_hostnames(info.hostname) if '*' not in host)
+    
+    def default_urls(self):
+        """Sample URLs on every known hostname plus the adversarial inputs"""
+        urls = [f"{scheme}://{host}{path}" for host in sorted(self.hostnames)
+                for scheme in ("https", "http") for path in SAMPLE_PATHS]
+        return urls + ADVERSARIAL_URLS
+    
+    def analyze(self, urls=None):
+        """Return the report for every collected pattern, most expensive first"""
+        urls = urls or self.default_urls()
+        entries = {}
+        timeable = []
+        for pattern, sources in self.patterns.items():
+            issues, error = structural_issues(pattern)
+            entries[pattern] = {
+                "pattern": pattern,
+                "sources": [{"module": module, "kind": kind} for module, kind in sources],
+                "issues": issues,
+                "error": error
+            }
+            if error is None:
+                timeable.append(pattern)
+        
+        timings = TimingPool(urls, self.jobs, self.timeout).run(timeable)
+        for pattern, timing in timings.items():
+            entries[pattern].update(timing)
+        
+        for entry in entries.values():
+            entry["status"] = self.status(entry)
+        
+        order = {"timeout": 0, "over-budget": 1, "invalid": 2, "flagged": 3, "ok": 4}
+        ranked = sorted(entries.values(), key=lambda entry: (order[entry["status"]], -entry.get("max_us", 0.0)))
+        return {
+            "patterns": len(ranked),
+            "urls": len(urls),
+            "budget_us": self.budget_us,
+            "timeout_s": self.timeout,
+            "counts": {status: sum(1 for entry in ranked if entry["status"] == status) for status in order},
+            "results": ranked
+        }
+    
+    def status(self, entry):
+        """ok, flagged (structural error), over-budget, timeout or invalid"""
+        if entry["error"] is not None:
+            return "invalid"
+        if entry.get("timeout"):
+            return "timeout"
+        if entry.get("max_us", 0.0) > self.budget_us:
+            return "over-budget"
+        if any(issue["severity"] == "error" for issue in entry["issues"]):
+            return "flagged"
+        return "ok"
+
+def load_urls(path):
+    """URLs from a file, one per line; blank lines and # comments are skipped"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Check and time the URL patterns of QuantumultX scripts")
+    add_source_arguments(parser)
+    parser.add_argument("--urls", help="URL corpus file, one URL per line (default: generated from the hostnames)")
+    parser.add_argument("--budget-us", type=float, default=1000.0,
+                        help="worst-case microseconds per URL a pattern may take (default: 1000)")
+    parser.add_argument("--timeout", type=float, default=2.0,
+                        help="seconds before timing a pattern is abandoned (default: 2)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of timing processes (default: CPU count)")
+    parser.add_argument("--fail", action="store_true",
+                        help="exit non-zero if a pattern does not compile, times out, is over budget "
+                             "or has a nested quantifier")
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    
+    analyzer = PatternAnalyzer(args.budget_us, args.timeout, args.jobs)
+    try:
+        analyzer.add_scripts(args.qx_folder, args.recursive, args.subdir)
+    except ProviderError as e:
+        parser.error(str(e))
+    report = analyzer.analyze(load_urls(args.urls) if args.urls else None)
+    
+    log = analyzer.converter.log
+    for entry in report["results"]:
+        if entry["status"] == "ok":
+            break
+        modules = ", ".join(sorted({source["module"] for source in entry["sources"]}))
+        detail = entry["error"] or "; ".join(issue["message"] for issue in entry["issues"] if issue["severity"] != "info")
+        cost = "timed out" if entry.get("timeout") else f"{entry.get('max_us', 0.0)} us worst case"
+        log(f"{entry['status']}: {entry['pattern']} ({modules}): {cost}{'; ' + detail if detail else ''}", "WARN")
+    
+    write_json_report(report, args.output)
+    if args.output:
+        log(f"{report['patterns']} patterns timed against {report['urls']} URLs, report written to {args.output}")
+    
+    failing = sum(report["counts"][status] for status in ("timeout", "over-budget", "invalid", "flagged"))
+    if args.fail and failing:
+        log(f"{failing} patterns are invalid or exceed the cost budget", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Shared external rule-set files for long [Rule] lists
+
+A run of consecutive rules sending traffic to the same policy is moved into
+a rule-set file and replaced by one RULE-SET,URL,POLICY line. The file holds
+the rules sorted, without duplicates, and with DOMAIN / DOMAIN-SUFFIX entries
+already matched by a broader DOMAIN-SUFFIX collapsed into it. It is named after
+its policy and content hash, so modules carrying the same list share one file
+that clients download and cache once.
+
+Only consecutive rules are grouped: the client still evaluates the module's
+rules in their original order, since rules of other policies never move across
+a set.
+"""
+
+import sys
+import hashlib
+import argparse
+
+from hostname_index import WildcardTrie, is_plain, normalize_host
+
+# Rule types a rule-set file can hold
+RULE_SET_TYPES = ("DOMAIN", "DOMAIN-SUFFIX", "DOMAIN-KEYWORD", "IP-CIDR", "IP-CIDR6", "IP-ASN",
+                  "GEOIP", "USER-AGENT", "URL-REGEX", "PROCESS-NAME", "DEST-PORT", "SRC-IP")
+DOMAIN_TYPES = ("DOMAIN", "DOMAIN-SUFFIX")
+
+# Rule type spellings that mean the same thing, also used by the converter's parser
+RULE_TYPE_ALIASES = {"HOST": "DOMAIN", "HOST-SUFFIX": "DOMAIN-SUFFIX", "HOST-KEYWORD": "DOMAIN-KEYWORD"}
+
+RULE_SET_DIRECTORY = "RuleSet"
+RULE_SET_EXTENSION = ".list"
+DEFAULT_MIN_RULES = 10
+
+def normalize_rule(rule_type, value):
+    """TYPE,VALUE with aliases resolved and domains lower-cased, None for rules a set cannot hold"""
+    rule_type = rule_type.strip().upper()
+    rule_type = RULE_TYPE_ALIASES.get(rule_type, rule_type)
+    if rule_type not in RULE_SET_TYPES:
+        return None
+    
+    value = value.strip()
+    if rule_type in DOMAIN_TYPES or rule_type == "DOMAIN-KEYWORD":
+        value = normalize_host(value)
+    return f"{rule_type},{value}" if value else None
+
+def rule_set_line(entry):
+    """TYPE,VALUE of a rule that can move into a rule-set file, else None
+    
+    Rules carrying options after the policy (no-resolve, extended-matching, ...)
+    stay in the module, as do rules without a policy.
+    """
+    if entry.kind != "rule" or not entry.pattern or not entry.action:
+        return None
+    if entry.text is not None and len(entry.text.split(',')) != 3:
+        return None
+    return normalize_rule(entry.rule_type, entry.pattern)
+
+def collapse_lines(lines):
+    """Sorted, unique lines with domains matched by a broader DOMAIN-SUFFIX dropped"""
+    lines = set(lines)
+    suffixes = {line.split(',', 1)[1] for line in lines if line.startswith("DOMAIN-SUFFIX,")}
+    trie = WildcardTrie()
+    for suffix in suffixes:
+        if is_plain(suffix):
+            trie.add(f"*.{suffix}")
+    
+    kept = []
+    for line in lines:
+        rule_type, value = line.split(',', 1)
+        if rule_type == "DOMAIN" and (value in suffixes or (is_plain(value) and trie.covered(value))):
+            continue
+        if rule_type == "DOMAIN-SUFFIX" and is_plain(value) and trie.covered(f"*.{value}"):
+            continue
+        kept.append(line)
+    return sorted(kept, key=line_key)
+
+def line_key(line):
+    """Sort key keeping each rule type together and domains ordered by their reversed labels"""
+    rule_type, value = line.split(',', 1)
+    if rule_type in DOMAIN_TYPES:
+        return (rule_type, value.split('.')[::-1])
+    return (rule_type, [value])
+
+def policy_slug(policy):
+    """File name safe form of a policy name"""
+    slug = "".join(char if char.isalnum() else "-" for char in policy.lower()).strip('-')
+    return slug or "policy"
+
+class RuleSet:
+    """Collapsed rules of one policy, replacing rules[start:stop] of a module"""
+    __slots__ = ("policy", "lines", "start", "stop")
+    
+    def __init__(self, policy, lines, start, stop):
+        self.policy = policy
+        self.lines = lines
+        self.start = start
+        self.stop = stop
+    
+    def data(self):
+        return "".join(f"{line}\n" for line in self.lines).encode('utf-8')
+    
+    @property
+    def filename(self):
+        """Content address: the same rules for the same policy always land in the same file"""
+        digest = hashlib.sha256(self.data()).hexdigest()[:16]
+        return f"{policy_slug(self.policy)}-{digest}{RULE_SET_EXTENSION}"
+    
+    def fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+    
+    def __eq__(self, other):
+        return isinstance(other, RuleSet) and self.fields() == other.fields()
+    
+    def __repr__(self):
+        return f"RuleSet({self.policy!r}, {len(self.lines)} rules, rules[{self.start}:{self.stop}])"
+
+def find_rule_sets(rules, min_rules=DEFAULT_MIN_RULES):
+    """RuleSets for every run of at least min_rules consecutive same-policy rules
+    
+    Policies compare case-insensitively, REJECT and reject being the same policy;
+    the set keeps the spelling of its first rule.
+    """
+    rule_sets = []
+    start = 0
+    while start < len(rules):
+        first = rule_set_line(rules[start])
+        if first is None:
+            start += 1
+            continue
+        
+        policy = rules[start].action.strip()
+        lines = [first]
+        stop = start + 1
+        while stop < len(rules):
+            line = rule_set_line(rules[stop])
+            if line is None or rules[stop].action.strip().lower() != policy.lower():
+                break
+            lines.append(line)
+            stop += 1
+        
+        if stop - start >= min_rules:
+            rule_sets.append(RuleSet(policy, collapse_lines(lines), start, stop))
+        start = stop
+    return rule_sets
+
+def read_list(path):
+    """Rule lines of a rule-set file or module [Rule] section, skipping comments and policies"""
+    lines = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        for raw in file:
+            raw = raw.strip()
+            if not raw or raw.startswith(('#', ';', '//', '[')):
+                continue
+            parts = raw.split(',')
+            line = normalize_rule(parts[0], parts[1]) if len(parts) >= 2 else None
+            if line is not None:
+                lines.append(line)
+    return lines
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Merge rule lists into one sorted, collapsed rule-set file")
+    parser.add_argument("lists", nargs="+", help="rule-set files or rule lines (TYPE,VALUE[,POLICY]) to merge")
+    parser.add_argument("-o", "--output", help="write the rule set here instead of stdout")
+    args = parser.parse_args()
+    
+    lines = []
+    for path in args.lists:
+        lines.extend(read_list(path))
+    collapsed = collapse_lines(lines)
+    data = "".join(f"{line}\n" for line in collapsed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(data)
+    else:
+        sys.stdout.write(data)
+    print(f"{len(lines)} rules in, {len(collapsed)} out", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Replay URLs against converted modules offline and report what would fire
+
+Modules are loaded either from the parsed IR of QuantumultX scripts or from
+emitted Loon plugins / Surge modules. Regex patterns are bucketed by the host
+they can only ever match: an anchored ^https?://api\\.example\\.com/ pattern
+sits under "api.example.com", a ^https?://.*\\.example\\.com/ pattern under the
+suffix "example.com". For each URL only the buckets of its host and the
+patterns that couldn't be bucketed run, instead of every regex.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from glob import glob
+from collections import deque
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:
+    # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from script_converter import ScriptConverter, add_source_arguments
+from input_providers import ProviderError
+from hostname_index import split_hostnames
+from rule_sets import RULE_SET_DIRECTORY, RULE_TYPE_ALIASES
+
+REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+SLASH = ord('/')
+AUTHORITY_ENDS = (SLASH, ord('?'), ord('#'))
+
+# Section names of emitted files and what they hold
+LOON_SECTIONS = {"[Rule]": "rule", "[Rewrite]": "rewrite", "[Script]": "script", "[MITM]": "mitm"}
+SURGE_SECTIONS = {"[Rule]": "rule", "[Map Local]": "rewrite", "[URL Rewrite]": "rewrite",
+                  "[Body Rewrite]": "body", "[Script]": "script", "[MITM]": "mitm"}
+EMITTED_EXTENSIONS = (".plugin", ".sgmodule")
+
+SURGE_SCRIPT_RE = re.compile(r'^(.+?)\s*=\s*type=([\w-]+),\s*pattern=(.+?),\s*script-path=')
+LOON_SCRIPT_LINE_RE = re.compile(r'^(http-\w+)\s+(\S+)')
+AUTHORITY_RE = re.compile(r'://([^/?#]*)')
+
+# Distinct authorities remembered by Matcher.lookup before the cache starts over
+HOST_CACHE_SIZE = 100000
+
+def can_leave_host(items):
+    """True if any of the parsed regex items could consume a '/', '?' or '#', the
+    characters that end the authority of a URL
+    """
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            if av in AUTHORITY_ENDS:
+                return True
+        elif op in (sre_constants.ANY, sre_constants.NOT_LITERAL):
+            # [^/] still matches '?' and '#'
+            return True
+        elif op is sre_constants.IN:
+            if set_matches_authority_end(av):
+                return True
+        elif op in REPEATS:
+            if can_leave_host(av[2]):
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if can_leave_host(av[-1]):
+                return True
+        elif op is sre_constants.BRANCH:
+            if any(can_leave_host(branch) for branch in av[1]):
+                return True
+        elif op not in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            # Back references and anything exotic: assume the worst
+            return True
+    return False
+
+def set_matches_authority_end(items):
+    """Whether a character class such as [^.] or [\\w-] contains '/', '?' or '#'"""
+    negate = False
+    found = set()
+    for op, av in items:
+        if op is sre_constants.NEGATE:
+            negate = True
+        elif op is sre_constants.LITERAL:
+            found.update(char for char in AUTHORITY_ENDS if av == char)
+        elif op is sre_constants.RANGE:
+            found.update(char for char in AUTHORITY_ENDS if av[0] <= char <= av[1])
+        elif op is sre_constants.CATEGORY:
+            if av in (sre_constants.CATEGORY_NOT_DIGIT, sre_constants.CATEGORY_NOT_WORD,
+                      sre_constants.CATEGORY_NOT_SPACE):
+                found.update(AUTHORITY_ENDS)
+        else:
+            return True
+    return any((char in found) != negate for char in AUTHORITY_ENDS)
+
+def literal_variants(items, limit=64):
+    """Every string the parsed items can match when they are only literals, alternations
+    and optional parts, such as (api|www)\.; None if there are more than limit or
+    a variant contains '/', '?' or '#'
+    """
+    variants = [""]
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            options = [chr(av)]
+        elif op is sre_constants.SUBPATTERN:
+            options = literal_variants(av[-1], limit)
+        elif op is sre_constants.BRANCH:
+            options = []
+            for branch in av[1]:
+                branch_variants = literal_variants(branch, limit)
+                if branch_variants is None:
+                    return None
+                options.extend(branch_variants)
+        elif op is sre_constants.IN and all(item_op is sre_constants.LITERAL for item_op, _ in av):
+            options = [chr(value) for _, value in av]
+        elif op in REPEATS and av[0] in (0, 1) and av[1] == 1:
+            options = literal_variants(av[2], limit)
+            if options is not None and av[0] == 0:
+                options = options + [""]
+        else:
+            return None
+        
+        if options is None or any(char in option for option in options for char in "/?#"):
+            return None
+        variants = [variant + option for variant in variants for option in options]
+        if len(variants) > limit:
+            return None
+    return variants
+
+def host_key(pattern):
+    """("host", hosts) or ("suffix", suffixes) when pattern only matches URLs on those hosts
+    
+    Only ^-anchored, case-sensitive patterns whose host part ends in a literal '/'
+    qualify. Alternations of literals expand into several hosts. A suffix needs
+    every wildcard before it to be unable to cross a '/', '?' or '#', so it can't
+    reach past the authority. Returns None for anything else.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError, OverflowError):
+        return None
+    if parsed.state.flags & (re.IGNORECASE | re.VERBOSE):
+        return None
+    
+    items = list(parsed)
+    if not items or items[0] != (sre_constants.AT, sre_constants.AT_BEGINNING):
+        return None
+    
+    # Scheme: literals plus an optional character, up to ://
+    scheme = ""
+    position = 1
+    while position < len(items) and not scheme.endswith("://"):
+        op, av = items[position]
+        if op is sre_constants.LITERAL:
+            scheme += chr(av)
+        elif not (op in REPEATS and av[0] == 0 and av[1] == 1 and not can_leave_host(av[2])):
+            return None
+        position += 1
+    if not scheme.endswith("://"):
+        return None
+    
+    # Host: literal tails after the last wildcard, up to the first literal '/'
+    runs = [""]
+    wildcard = False
+    for op, av in items[position:]:
+        if op is sre_constants.LITERAL and av == SLASH:
+            if not wildcard:
+                return ("host", runs) if all(runs) else None
+            if all(run.startswith(".") and len(run) > 1 for run in runs):
+                return ("suffix", [run[1:] for run in runs])
+            return None
+        
+        options = literal_variants([(op, av)])
+        if options is not None and len(runs) * len(options) <= 64:
+            runs = [run + option for run in runs for option in options]
+        elif can_leave_host([(op, av)]):
+            return None
+        else:
+            wildcard = True
+            runs = [""]
+    return None
+
+def required_literals(pattern):
+    """Literals of which every match of pattern must contain at least one, () if unknown
+    
+    The requirement is either the longest literal run of the pattern or an alternation
+    of literals such as (itranscreen|tencentcs), whichever has the longer shortest
+    member. Runs every URL contains anyway, like "https://", don't count.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError, OverflowError):
+        return ()
+    if parsed.state.flags & re.IGNORECASE:
+        return ()
+    
+    def score(literals):
+        shortest = min(literals, key=len)
+        return 0 if shortest in "https://" else len(shortest)
+    
+    best = ()
+    run = ""
+    for op, av in list(parsed) + [(None, None)]:
+        if op is sre_constants.LITERAL:
+            run += chr(av)
+            continue
+        if run and (not best or score((run,)) > score(best)):
+            best = (run,)
+        run = ""
+        if op is sre_constants.SUBPATTERN:
+            variants = literal_variants([(op, av)], limit=16)
+            if variants and (not best or score(variants) > score(best)):
+                best = tuple(variants)
+    return best if best and score(best) else ()
+
+def url_authority(url):
+    """Text between :// and the first '/', '?' or '#', matching what host_key keys on"""
+    match = AUTHORITY_RE.search(url)
+    return match.group(1) if match else ""
+
+def url_host(authority):
+    """Lower-cased host of an authority, without user info or port"""
+    if '@' not in authority and ':' not in authority:
+        return authority.lower()
+    host = authority.rpartition('@')[2]
+    if host.startswith('['):
+        return host[1:host.find(']')].lower()
+    return host.partition(':')[0].lower()
+
+class Matcher:
+    """Rules, rewrites and scripts of many modules, bucketed by host for fast replay"""
+    
+    def __init__(self):
+        self.exact = {}
+        self.suffix = {}
+        self.unbucketed = []
+        # Unbucketed patterns split by prepare(): "always" have no useful literal, the
+        # others run only when literal_gate finds one of their literals in the URL
+        self.always = None
+        self.literal_gate = None
+        self.literal_finder = None
+        self.literal_entries = {}
+        # Host rules, keyed on the lower-cased host
+        self.domains = {}
+        self.domain_suffixes = {}
+        self.keywords = []
+        self.mitm = {}
+        self.mitm_cache = {}
+        # authority -> (host, fired host rules, bucketed candidates); logs repeat hosts a lot
+        self.host_cache = {}
+        self.unsupported = 0
+        # RULE-SET references whose file was not found next to the emitted modules
+        self.missing_rule_sets = set()
+        self.patterns = 0
+    
+    def add_pattern(self, module, section, detail, pattern):
+        """Add a regex entry; section is rule, rewrite or script"""
+        try:
+            regex = re.compile(pattern)
+        except re.error:
+            self.unsupported += 1
+            return
+        self.patterns += 1
+        self.host_cache.clear()
+        
+        # Unbucketed patterns only run on URLs containing one of their required literals
+        key = host_key(pattern)
+        if key is None:
+            self.unbucketed.append((module, section, detail, pattern, regex, required_literals(pattern)))
+            self.always = None
+            return
+        entry = (module, section, detail, pattern, regex, ())
+        buckets = self.exact if key[0] == "host" else self.suffix
+        for host in dict.fromkeys(key[1]):
+            buckets.setdefault(host, []).append(entry)
+    
+    def add_rule(self, module, rule_type, value, policy):
+        """Add a host or URL rule such as DOMAIN-SUFFIX,example.com,REJECT"""
+        rule_type = (rule_type or "").strip().upper()
+        rule_type = RULE_TYPE_ALIASES.get(rule_type, rule_type)
+        value = (value or "").strip()
+        entry = (module, "rule", f"{rule_type},{value},{(policy or '').strip()}")
+        self.host_cache.clear()
+        if rule_type == "URL-REGEX":
+            self.add_pattern(module, "rule", entry[2], value)
+        elif rule_type == "DOMAIN":
+            self.domains.setdefault(value.lower(), []).append(entry)
+        elif rule_type == "DOMAIN-SUFFIX":
+            self.domain_suffixes.setdefault(value.lower().lstrip('.'), []).append(entry)
+        elif rule_type == "DOMAIN-KEYWORD":
+            self.keywords.append((value.lower(), entry))
+        else:
+            # IP, GEOIP, USER-AGENT and the like need more than a URL
+            self.unsupported += 1
+    
+    def set_mitm(self, module, hostnames):
+        """MITM hostnames of a module; https rewrites and scripts only fire on these"""
+        self.mitm[module] = hostnames
+        self.mitm_cache.clear()
+    
+    def intercepts(self, module, host):
+        """Whether module decrypts https traffic to host"""
+        key = (module, host)
+        cached = self.mitm_cache.get(key)
+        if cached is None:
+            patterns = self.mitm.get(module, ())
+            cached = any(fnmatchcase(host, pattern) for pattern in patterns if not pattern.startswith('-'))
+            cached = cached and not any(fnmatchcase(host, pattern[1:]) for pattern in patterns if pattern.startswith('-'))
+            self.mitm_cache[key] = cached
+        return cached
+    
+    def candidates(self, authority):
+        """Bucketed regex entries that could match a URL with this authority"""
+        found = self.exact.get(authority, [])
+        if self.suffix:
+            index = authority.find('.')
+            while index >= 0:
+                bucket = self.suffix.get(authority[index + 1:])
+                if bucket:
+                    found = found + bucket
+                index = authority.find('.', index + 1)
+        return found
+    
+    def prepare(self):
+        """Build the literal gate, which tells whether a URL holds any gated literal at all,
+        and the finder, which then lists the literals present
+        
+        The finder is a lookahead tried at every position, so it reports one literal per
+        start position, the longest. Shorter literals starting at the same place are
+        prefixes of it and are added back through literal_entries.
+        """
+        self.always = [entry for entry in self.unbucketed if not entry[5]]
+        postings = {}
+        for entry in self.unbucketed:
+            for literal in entry[5]:
+                postings.setdefault(literal, []).append(entry)
+        
+        literals = sorted(postings, key=len, reverse=True)
+        self.literal_entries = {
+            literal: list(dict.fromkeys(entry for other in literals if literal.startswith(other)
+                                        for entry in postings[other]))
+            for literal in literals
+        }
+        if literals:
+            alternation = "|".join(map(re.escape, literals))
+            self.literal_gate = re.compile(alternation)
+            self.literal_finder = re.compile(f"(?=({alternation}))")
+    
+    def host_rules(self, host):
+        """DOMAIN, DOMAIN-SUFFIX and DOMAIN-KEYWORD rules matching host"""
+        fired = list(self.domains.get(host, ()))
+        if self.domain_suffixes:
+            index = -1
+            while True:
+                fired.extend(self.domain_suffixes.get(host[index + 1:], ()))
+                index = host.find('.', index + 1)
+                if index < 0:
+                    break
+        for keyword, entry in self.keywords:
+            if keyword in host:
+                fired.append(entry)
+        return fired
+    
+    def lookup(self, authority):
+        """Cached (host, fired host rules, bucketed candidates) of an authority"""
+        cached = self.host_cache.get(authority)
+        if cached is None:
+            if len(self.host_cache) >= HOST_CACHE_SIZE:
+                self.host_cache.clear()
+            host = url_host(authority)
+            cached = self.host_cache[authority] = (host, self.host_rules(host), self.candidates(authority))
+        return cached
+    
+    def match(self, url):
+        """Return (fired, skipped): entries that fire, and https entries blocked by a missing MITM hostname"""
+        if self.always is None:
+            self.prepare()
+        host, fired, candidates = self.lookup(url_authority(url))
+        fired = list(fired)
+        skipped = []
+        
+        if self.always:
+            candidates = candidates + self.always
+        if self.literal_gate is not None and self.literal_gate.search(url) is not None:
+            found = set(self.literal_finder.findall(url))
+            gated = [entry for literal in found for entry in self.literal_entries[literal]]
+            candidates = candidates + list(dict.fromkeys(gated))
+        if not candidates:
+            return fired, skipped
+        
+        https = url.startswith("https://")
+        for module, section, detail, pattern, regex, literals in candidates:
+            if regex.search(url) is None:
+                continue
+            entry = (module, section, detail)
+            if https and section != "rule" and not self.intercepts(module, host):
+                skipped.append(entry)
+            else:
+                fired.append(entry)
+        return fired, skipped
+    
+    def summary(self):
+        return {
+            "patterns": self.patterns,
+            "host_buckets": len(self.exact),
+            "suffix_buckets": len(self.suffix),
+            "unbucketed": len(self.unbucketed),
+            "host_rules": sum(map(len, self.domains.values())) + sum(map(len, self.domain_suffixes.values()))
+                          + len(self.keywords),
+            "unsupported": self.unsupported,
+            "missing_rule_sets": sorted(self.missing_rule_sets)
+        }
+
+def load_ir(matcher, source, recursive=False, subdir=""):
+    """Load every QuantumultX script of a folder, archive or git spec through the converter's parser"""
+    converter = ScriptConverter()
+    for _, _, info in converter.iter_script_infos(source, recursive, subdir):
+        module = info.filename
+        for rule in info.rules:
+            matcher.add_rule(module, rule.rule_type, rule.pattern, rule.action)
+        for entry in info.rewrites:
+            if entry.pattern:
+                matcher.add_pattern(module, "rewrite", entry.action or entry.text, entry.pattern)
+        for entry in info.scripts:
+            if entry.pattern:
+                matcher.add_pattern(module, "script", f"{entry.rule_type} {entry.script_path}", entry.pattern)
+        matcher.set_mitm(module, split_hostnames(info.hostname))
+
+def load_rule_set(matcher, module, directory, url, policy):
+    """Add the rules of a RULE-SET reference from the converter's rule-set folder
+    
+    Rule-set files are content addressed, so the file name at the end of the URL
+    is enough to find the local copy; a missing file is recorded in the summary.
+    """
+    path = os.path.join(directory, os.path.basename(url.split('?', 1)[0]))
+    if not os.path.isfile(path):
+        matcher.unsupported += 1
+        matcher.missing_rule_sets.add(url)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                rule_type, _, value = line.partition(',')
+                matcher.add_rule(module, rule_type, value, policy)
+
+def load_emitted(matcher, path):
+    """Load a Loon .plugin or Surge/Shadowrocket .sgmodule file
+    
+    RULE-SET lines are read from the RuleSet folder beside the module's folder,
+    where the converter writes them with --rule-sets.
+    """
+    module = os.path.splitext(os.path.basename(path))[0]
+    sections = LOON_SECTIONS if path.endswith(".plugin") else SURGE_SECTIONS
+    section = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('['):
+                section = sections.get(line)
+                continue
+            
+            if section == "rule":
+                parts = [part.strip() for part in line.split(',')]
+                if len(parts) >= 2 and parts[0].upper() == "RULE-SET":
+                    rule_sets = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(path))), RULE_SET_DIRECTORY)
+                    load_rule_set(matcher, module, rule_sets, parts[1], parts[2] if len(parts) > 2 else "")
+                elif len(parts) >= 2:
+                    matcher.add_rule(module, parts[0], parts[1], parts[2] if len(parts) > 2 else "")
+            elif section == "rewrite":
+                # "pattern - reject" or "pattern data-type=..." (Map Local)
+                pattern, _, action = line.partition(' ')
+                matcher.add_pattern(module, "rewrite", action.lstrip('- ').strip(), pattern)
+            elif section == "body":
+                # "http-response-jq pattern 'filter'" or "http-response pattern regex replacement ..."
+                parts = line.split(None, 2)
+                if len(parts) >= 2:
+                    matcher.add_pattern(module, "rewrite", " ".join([parts[0]] + parts[2:]), parts[1])
+            elif section == "script":
+                match = SURGE_SCRIPT_RE.match(line) or LOON_SCRIPT_LINE_RE.match(line)
+                if match and match.re is SURGE_SCRIPT_RE:
+                    matcher.add_pattern(module, "script", f"{match.group(2)} {match.group(1)}", match.group(3))
+                elif match:
+                    matcher.add_pattern(module, "script", match.group(1), match.group(2))
+            elif section == "mitm" and line.lower().startswith("hostname"):
+                matcher.set_mitm(module, split_hostnames(line.partition('=')[2]))
+
+def iter_urls(path):
+    """URLs from a file (or - for stdin), one per line"""
+    stream = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8', errors='replace')
+    try:
+        for line in stream:
+            url = line.strip()
+            if url and not url.startswith('#'):
+                yield url
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def load_sources(sources, recursive=False, subdir=""):
+    """Matcher for emitted-file folders, single emitted files and QuantumultX folders, archives or git specs"""
+    matcher = Matcher()
+    for source in sources:
+        if os.path.isdir(source):
+            emitted = sorted(path for extension in EMITTED_EXTENSIONS
+                             for path in glob(os.path.join(source, f"*{extension}")))
+            if emitted:
+                for path in emitted:
+                    load_emitted(matcher, path)
+            else:
+                load_ir(matcher, source, recursive, subdir)
+        elif source.endswith(EMITTED_EXTENSIONS):
+            load_emitted(matcher, source)
+        else:
+            load_ir(matcher, source, recursive, subdir)
+    return matcher
+
+def replay(matcher, urls, records=False):
+    """Match a batch of URLs, returning (counts, hits per entry, JSON lines or None)"""
+    counts = {"urls": len(urls), "matched": 0, "mitm_missing": 0}
+    hits = {}
+    lines = [] if records else None
+    for url in urls:
+        fired, skipped = matcher.match(url)
+        if not fired and not skipped:
+            continue
+        counts["matched"] += bool(fired)
+        counts["mitm_missing"] += bool(skipped)
+        for entry in fired:
+            key = " | ".join(entry)
+            hits[key] = hits.get(key, 0) + 1
+        if records:
+            record = {"url": url, "fired": [dict(zip(("module", "section", "entry"), entry)) for entry in fired]}
+            if skipped:
+                record["mitm_missing"] = [dict(zip(("module", "section", "entry"), entry)) for entry in skipped]
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+    return counts, hits, lines
+
+def iter_batches(urls, size):
+    """Lists of up to size URLs"""
+    batch = []
+    for url in urls:
+        batch.append(url)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Per-process matcher used by the worker pool
+_worker_matcher = None
+
+def _init_worker(sources, recursive, subdir):
+    """Build the matcher a worker process uses for all its batches"""
+    global _worker_matcher
+    logging.getLogger('script_converter').setLevel(logging.ERROR)
+    _worker_matcher = load_sources(sources, recursive, subdir)
+
+def _replay_in_worker(batch, records):
+    return replay(_worker_matcher, batch, records)
+
+def bounded_map(executor, batches, records, window):
+    """Like executor.map in batch order, but with at most window batches in flight,
+    so a huge URL file is never read into memory at once
+    """
+    pending = deque()
+    for batch in batches:
+        pending.append(executor.submit(_replay_in_worker, batch, records))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Replay URLs against converted modules and report what fires")
+    parser.add_argument("source", nargs="+",
+                        help="a QuantumultX script folder, archive or git:REPO@REF[..REF], "
+                             "or emitted .plugin/.sgmodule files or folders")
+    add_source_arguments(parser, positional=False)
+    parser.add_argument("--urls", required=True, help="file with one URL per line, - for stdin")
+    parser.add_argument("-o", "--output", help="write one JSON line per matching URL here")
+    parser.add_argument("--summary", help="write per-entry hit counts as JSON here")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=20000,
+                        help="URLs per worker batch (default: 20000)")
+    args = parser.parse_args()
+    
+    converter = ScriptConverter()
+    try:
+        matcher = load_sources(args.source, args.recursive, args.subdir)
+    except ProviderError as e:
+        parser.error(str(e))
+    converter.log(f"Loaded {json.dumps(matcher.summary())}")
+    
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    hits = {}
+    counts = {"urls": 0, "matched": 0, "mitm_missing": 0}
+    batches = iter_batches(iter_urls(args.urls), max(1, args.batch_size))
+    started = time.perf_counter()
+    try:
+        if args.jobs > 1:
+            executor = ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker, initargs=(args.source, args.recursive, args.subdir))
+            results = bounded_map(executor, batches, output is not None, args.jobs * 2)
+        else:
+            executor = None
+            results = (replay(matcher, batch, output is not None) for batch in batches)
+        
+        for batch_counts, batch_hits, lines in results:
+            for key, value in batch_counts.items():
+                counts[key] += value
+            for key, value in batch_hits.items():
+                hits[key] = hits.get(key, 0) + value
+            if output:
+                output.writelines(lines)
+        if executor:
+            executor.shutdown()
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - started
+    
+    converter.log(f"{counts['urls']} URLs in {elapsed:.2f}s, {counts['matched']} matched, "
+                  f"{counts['mitm_missing']} hit entries whose host is not in the module's MITM list")
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump({**counts, "seconds": round(elapsed, 3), "matcher": matcher.summary(),
+                       "hits": dict(sorted(hits.items(), key=lambda item: (-item[1], item[0])))},
+                      f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,22 @@
 import os
 import re
 import sys
-from glob import glob
+import json
+import io
+import hashlib
+import tempfile
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import logging
 
+from hostname_index import minimize_hostnames, split_hostnames
+from module_catalog import ModuleCatalog, catalog_entry
+from input_providers import ProviderError, iter_script_paths, open_provider
+from body_rewrite import NotCompilable, body_script_path, compile_body
+from rule_sets import RULE_SET_DIRECTORY, RULE_SET_EXTENSION, DEFAULT_MIN_RULES, RULE_TYPE_ALIASES, find_rule_sets
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,10 +28,555 @@ logging.basicConfig(
 )
 logger = logging.getLogger('script_converter')
 
+# Bump whenever generated output changes, so the manifest invalidates old builds
+CONVERTER_VERSION = "1.3.0"
+
+# Scripts are streamed in chunks of this size until the header comment closes
+HEADER_CHUNK_SIZE = 8192
+# Chunk size for hashing the rest of a script
+HASH_CHUNK_SIZE = 65536
+
+# Host part of a URL pattern once regex escapes are removed
+URL_HOST_RE = re.compile(r'https?\??://([A-Za-z0-9*.-]+)')
+
+# One scan over the header stops at every place a token can start; the anchored
+# patterns below then decide what, if anything, starts there
+HEADER_TOKEN_RE = re.compile(r'\[|#!|hostname|📜')
+SECTION_TOKEN_RE = re.compile(r'\[(rule|rewrite|script|filter_local|rewrite_local|mitm)\]', re.IGNORECASE)
+METADATA_TOKEN_RE = re.compile(r'#!(name|desc|category|author|icon)\s*=\s*', re.IGNORECASE)
+HOSTNAME_TOKEN_RE = re.compile(r'hostname\s*=\s*')
+SCROLL_TOKEN_RE = re.compile(r'📜\s*')
+LINE_END_RE = re.compile(r'[\n\r]')
+
+# Last resort name guesses when the header carries no usable name
+NAME_GUESS_RE = re.compile(r'彩云天气|caiyun|AXS Payment', re.IGNORECASE)
+NAME_GUESS_SUFFIX = "脚本"
+
+# Build manifest recording source and output hashes of the last conversion
+MANIFEST_FILE = ".converter_manifest.json"
+
+# Canonical output -> byte-identical copies, written by --dedup-outputs manifest
+OUTPUT_DEDUP_FILE = "outputs.dedup.json"
+DEDUP_MODES = ("hardlink", "manifest")
+
+# Loon script line: type, pattern and script path
+LOON_SCRIPT_RE = re.compile(r'(http-(?:response|request))\s+([^\s]+)\s+script-path=([^,]+)')
+LOON_TAG_RE = re.compile(r'tag=([^,\s]+)')
+
+class Entry:
+    """One parsed rule, rewrite or script line
+    
+    text holds the source line when it was already in Loon syntax and is emitted
+    verbatim; entries converted from QX syntax are rendered from their fields.
+    """
+    __slots__ = ("kind", "rule_type", "pattern", "action", "script_path",
+                 "requires_body", "tag", "comment", "text")
+    
+    def __init__(self, kind, rule_type=None, pattern=None, action=None, script_path=None,
+                 requires_body=False, tag=None, comment="", text=None):
+        self.kind = kind
+        self.rule_type = rule_type
+        self.pattern = pattern
+        self.action = action
+        self.script_path = script_path
+        self.requires_body = requires_body
+        self.tag = tag
+        self.comment = comment
+        self.text = text
+    
+    def fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+    
+    def __eq__(self, other):
+        return isinstance(other, Entry) and self.fields() == other.fields()
+    
+    def key(self):
+        """What the entry does, without comments, tags or formatting
+        
+        QX entries and their Loon equivalents share a key, so it identifies duplicates
+        across sources.
+        """
+        if self.kind == "rule":
+            rule_type = (self.rule_type or "").strip().upper()
+            return ("rule", RULE_TYPE_ALIASES.get(rule_type, rule_type),
+                    (self.pattern or "").strip(), (self.action or "").strip().lower())
+        if self.kind == "script":
+            if self.script_path is None:
+                return ("script", " ".join((self.text or "").split()))
+            return ("script", self.rule_type, (self.pattern or "").strip(), self.script_path.strip(),
+                    bool(self.requires_body))
+        if self.action is None:
+            return (self.kind, " ".join((self.text or self.pattern or "").split()))
+        return (self.kind, (self.pattern or "").strip(), self.action.strip().lower())
+    
+    def digest(self):
+        """Content address of key()"""
+        return hashlib.sha1("\x1f".join(map(str, self.key())).encode('utf-8')).hexdigest()[:16]
+    
+    def __repr__(self):
+        return f"Entry({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+class ScriptInfo:
+    """Parsed form of one script shared by all emitters"""
+    __slots__ = ("filename", "metadata", "rules", "rewrites", "scripts", "hostname", "hostname_source",
+                 "hostname_dropped", "body_rewrites", "rule_sets")
+    
+    def __init__(self, filename, metadata):
+        self.filename = filename
+        self.metadata = metadata
+        self.rules = []
+        self.rewrites = []
+        self.scripts = []
+        self.hostname = ""
+        # "mitm", "header", "guess" (from a URL pattern) or "default"
+        self.hostname_source = None
+        # Entries removed as "duplicate" or "covered" by a wildcard
+        self.hostname_dropped = {}
+        # script-path -> BodyRewrite for scripts compiled to native body rewrites
+        self.body_rewrites = {}
+        # RuleSets replacing runs of rules by RULE-SET references
+        self.rule_sets = []
+    
+    def fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+    
+    def __eq__(self, other):
+        return isinstance(other, ScriptInfo) and self.fields() == other.fields()
+    
+    def __repr__(self):
+        return f"ScriptInfo({self.filename!r}, rules={len(self.rules)}, rewrites={len(self.rewrites)}, scripts={len(self.scripts)})"
+
+class StageTimer:
+    """Context manager adding wall time and a byte count to one stage of a file profile"""
+    __slots__ = ("stages", "name", "bytes", "started")
+    
+    def __init__(self, stages, name):
+        self.stages = stages
+        self.name = name
+        self.bytes = 0
+        self.started = 0.0
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        record = self.stages.setdefault(self.name, [0.0, 0])
+        record[0] += time.perf_counter() - self.started
+        record[1] += self.bytes
+        return False
+
+class NullStage:
+    """Stand-in for StageTimer when profiling is off"""
+    bytes = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def __setattr__(self, name, value):
+        pass
+
+NULL_STAGE = NullStage()
+
+class HashingReader(io.RawIOBase):
+    """Raw stream feeding every byte read from file into digest"""
+    
+    def __init__(self, file, digest):
+        self.file = file
+        self.digest = digest
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        count = self.file.readinto(buffer)
+        if count:
+            self.digest.update(memoryview(buffer)[:count])
+        return count
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def build_profile_report(profiles, wall_seconds, top=10):
+    """Summarise per-file stage timings into totals, percentiles and the slowest files
+    
+    profiles maps a file name to {stage: [seconds, bytes]}.
+    """
+    def summary(values):
+        values = sorted(values)
+        return {
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p90_ms": round(percentile(values, 0.90) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3) if values else 0.0
+        }
+    
+    stage_names = sorted({stage for stages in profiles.values() for stage in stages})
+    stages = {}
+    for name in stage_names:
+        records = [stages_[name] for stages_ in profiles.values() if name in stages_]
+        stages[name] = {
+            "files": len(records),
+            "total_ms": round(sum(seconds for seconds, _ in records) * 1000, 3),
+            "bytes": sum(nbytes for _, nbytes in records),
+            **summary(seconds for seconds, _ in records)
+        }
+    
+    totals = {name: sum(seconds for seconds, _ in stages_.values()) for name, stages_ in profiles.items()}
+    slowest = sorted(totals, key=lambda name: (-totals[name], name))[:top]
+    
+    return {
+        "converter_version": CONVERTER_VERSION,
+        "files": len(profiles),
+        "wall_ms": round(wall_seconds * 1000, 3),
+        "stages": stages,
+        "per_file": {"total_ms": round(sum(totals.values()) * 1000, 3), **summary(totals.values())},
+        "slowest": [
+            {
+                "file": name,
+                "total_ms": round(totals[name] * 1000, 3),
+                "stages": {stage: {"ms": round(seconds * 1000, 3), "bytes": nbytes}
+                           for stage, (seconds, nbytes) in sorted(profiles[name].items())}
+            }
+            for name in slowest
+        ]
+    }
+
+# Output targets by name, filled by @register_emitter
+EMITTERS = {}
+
+def register_emitter(cls):
+    """Class decorator adding an emitter to the registry"""
+    EMITTERS[cls.name] = cls
+    return cls
+
+class Emitter:
+    """Renders a ScriptInfo into one target's module format
+    
+    Subclasses implement emit(), which writes the module piece by piece through a
+    write callable; render() joins the pieces for write_output to compare and store.
+    """
+    name = None
+    directory = None
+    extension = None
+    
+    def __init__(self, converter):
+        self.converter = converter
+    
+    def output_path(self, scriptname):
+        """Path of the module generated for a script, below the converter's output root"""
+        return os.path.join(self.converter.output_root, self.directory, f"{scriptname}{self.extension}")
+    
+    def emit(self, info, write):
+        """Write the module for info"""
+        raise NotImplementedError
+    
+    def render(self, info):
+        """Return the module as a string"""
+        parts = []
+        self.emit(info, parts.append)
+        return "".join(parts)
+    
+    def write_section(self, write, title, entries, render_line):
+        """Write a [Section] with its entries, repeating a comment only when it changes
+        
+        render_line may return None to drop an entry the target cannot express.
+        """
+        if not entries:
+            return
+        
+        write(f"\n\n[{title}]")
+        last_comment = ""
+        
+        for entry in entries:
+            # Add comment (if there's a new one)
+            if entry.comment and entry.comment != last_comment:
+                write(f"\n{entry.comment}")
+                last_comment = entry.comment
+            
+            line = render_line(entry)
+            if line is not None:
+                write(f"\n{line}")
+    
+    def loon_line(self, entry):
+        """Loon syntax for an entry"""
+        if entry.text is not None:
+            return entry.text
+        if entry.kind == "rule":
+            return f"{entry.rule_type},{entry.pattern},{entry.action}"
+        if entry.kind == "rewrite":
+            return f"{entry.pattern} - {entry.action}"
+        requires_body = "true" if entry.requires_body else "false"
+        return f"{entry.rule_type} {entry.pattern} script-path={entry.script_path}, requires-body={requires_body}, timeout=60, tag={entry.tag}"
+    
+    def reject_rewrites(self, info):
+        """Rewrites that reject the request"""
+        return [r for r in info.rewrites if r.action and r.action.startswith('reject')]
+    
+    def rules_with_sets(self, info):
+        """Rules with every run moved into a rule set replaced by its RULE-SET line"""
+        if not info.rule_sets:
+            return info.rules
+        
+        rules, position = [], 0
+        for rule_set in info.rule_sets:
+            rules.extend(info.rules[position:rule_set.start])
+            rules.append(Entry("rule", "RULE-SET", self.converter.rule_set_reference(rule_set), rule_set.policy,
+                               comment=info.rules[rule_set.start].comment))
+            position = rule_set.stop
+        rules.extend(info.rules[position:])
+        return rules
+    
+    def compiled_scripts(self, info, render):
+        """Split scripts into those still run as JS and rewrite entries replacing the others
+        
+        render(body_rewrite, pattern) returns the target's native line.
+        """
+        if not info.body_rewrites:
+            return info.scripts, []
+        
+        scripts, compiled = [], []
+        for script in info.scripts:
+            body_rewrite = info.body_rewrites.get(script.script_path)
+            if body_rewrite is None or script.rule_type != "http-response":
+                scripts.append(script)
+            else:
+                compiled.append(Entry("rewrite", pattern=script.pattern, comment=script.comment,
+                                      text=render(body_rewrite, script.pattern)))
+        return scripts, compiled
+
+@register_emitter
+class LoonEmitter(Emitter):
+    name = "loon"
+    directory = "Loon"
+    extension = ".plugin"
+    
+    def emit(self, info, write):
+        metadata = info.metadata
+        
+        # Basic config info
+        write(f"""#!name = {metadata["name"]}
+#!desc = {metadata["desc"]}
+#!category = {metadata["category"]}
+#!author = {metadata["author"]}
+#!icon = {metadata["icon"]}""")
+
+        scripts, compiled = self.compiled_scripts(info, lambda body_rewrite, pattern: body_rewrite.loon_line(pattern))
+        self.write_section(write, "Rule", self.rules_with_sets(info), self.loon_line)
+        self.write_section(write, "Rewrite", info.rewrites + compiled, self.loon_line)
+        self.write_section(write, "Script", scripts, self.loon_line)
+        
+        # Add MITM section
+        if info.hostname:
+            write(f"\n\n[MITM]\nhostname = {info.hostname}")
+
+@register_emitter
+class SurgeEmitter(Emitter):
+    name = "surge"
+    directory = "Surge"
+    extension = ".sgmodule"
+    # Whether compiled scripts become [Body Rewrite] lines
+    body_rewrite = True
+    
+    def emit(self, info, write):
+        metadata = info.metadata
+        
+        # Basic config info
+        write(f"""#!name = {metadata["name"]}
+#!desc = {metadata["desc"]}
+#!category = {metadata["category"]}
+#!author = {metadata["author"]}""")
+
+        scripts, compiled = info.scripts, []
+        if self.body_rewrite:
+            scripts, compiled = self.compiled_scripts(info, lambda body_rewrite, pattern: body_rewrite.surge_line(pattern))
+        
+        self.write_section(write, "Rule", self.rules_with_sets(info), self.loon_line)
+        self.write_rejects(info, write)
+        self.write_section(write, "Body Rewrite", compiled, self.loon_line)
+        self.write_section(write, "Script", scripts, self.script_namer(metadata["name"]))
+        
+        # Add MITM section
+        if info.hostname:
+            write(f"\n\n[MITM]\nhostname = %APPEND% {info.hostname}")
+    
+    def write_rejects(self, info, write):
+        """Map Local section answering reject rules locally"""
+        self.write_section(write, "Map Local", self.reject_rewrites(info), self.map_local_line)
+    
+    def map_local_line(self, rule):
+        # Set Map Local parameters
+        data_type = "text"
+        data = "{}"
+        
+        if "img" in rule.action:
+            data_type = "img"
+        elif "array" in rule.action:
+            data = "[]"
+        
+        return f"{rule.pattern} data-type={data_type} data=\"{data}\" status-code=200"
+    
+    def script_namer(self, name):
+        """Script line renderer numbering rules after the first as name_2, name_3, ..."""
+        rule_counter = 0
+        
+        def script_line(script):
+            nonlocal rule_counter
+            # Lines without a script path have no Surge equivalent
+            if not script.script_path:
+                return None
+            
+            rule_name = name if rule_counter == 0 else f"{name}_{rule_counter+1}"
+            rule_counter += 1
+            requires_body = "true" if script.requires_body else "false"
+            return f"{rule_name} = type={script.rule_type}, pattern={script.pattern}, script-path={script.script_path}, requires-body={requires_body}, max-size=-1, timeout=60"
+        
+        return script_line
+
+@register_emitter
+class ShadowrocketEmitter(SurgeEmitter):
+    """Shadowrocket reads Surge modules, but answers rejects through [URL Rewrite]"""
+    name = "shadowrocket"
+    directory = "Shadowrocket"
+    extension = ".sgmodule"
+    body_rewrite = False
+    
+    def write_rejects(self, info, write):
+        self.write_section(write, "URL Rewrite", self.reject_rewrites(info),
+                           lambda rule: f"{rule.pattern} - {rule.action}")
+
+@register_emitter
+class StashEmitter(Emitter):
+    """Stash override (YAML)"""
+    name = "stash"
+    directory = "Stash"
+    extension = ".stoverride"
+    
+    # Rule types Stash understands; everything else is dropped
+    rule_types = ("DOMAIN", "DOMAIN-SUFFIX", "DOMAIN-KEYWORD", "IP-CIDR", "IP-CIDR6",
+                  "GEOIP", "USER-AGENT", "PROCESS-NAME")
+    rule_aliases = RULE_TYPE_ALIASES
+    
+    def emit(self, info, write):
+        metadata = info.metadata
+        quote = self.quote
+        
+        # Basic config info
+        write(f"name: {quote(metadata['name'])}\n")
+        write(f"desc: {quote(metadata['desc'])}\n")
+        write(f"category: {quote(metadata['category'])}\n")
+        write(f"author: {quote(metadata['author'])}\n")
+        write(f"icon: {quote(metadata['icon'])}\n")
+        
+        # URL-REGEX rejects become url-rewrite rejects, other rules stay rules
+        rules = []
+        rewrites = []
+        for rule in info.rules:
+            rule_type = (rule.rule_type or "").strip().upper()
+            rule_type = self.rule_aliases.get(rule_type, rule_type)
+            if rule.pattern is None or rule.action is None:
+                continue
+            if rule_type in self.rule_types:
+                rules.append(f"{rule_type},{rule.pattern.strip()},{rule.action.strip().upper()}")
+            elif rule_type == "URL-REGEX" and rule.action.strip().lower().startswith('reject'):
+                rewrites.append(f"{rule.pattern.strip()} - {rule.action.strip().lower()}")
+        rewrites.extend(f"{rule.pattern} - {rule.action}" for rule in self.reject_rewrites(info))
+        scripts = [script for script in info.scripts if script.script_path]
+        hostnames = [host.strip() for host in info.hostname.split(',') if host.strip()]
+        
+        if rules:
+            write("\nrules:\n")
+            for rule in rules:
+                write(f"  - {quote(rule)}\n")
+        
+        if hostnames or rewrites or scripts:
+            write("\nhttp:\n")
+        
+        if hostnames:
+            write("  mitm:\n")
+            for host in hostnames:
+                write(f"    - {quote(host)}\n")
+        
+        if rewrites:
+            write("  url-rewrite:\n")
+            for rewrite in rewrites:
+                write(f"    - {quote(rewrite)}\n")
+        
+        if scripts:
+            names = [metadata["name"] if i == 0 else f"{metadata['name']}_{i+1}" for i in range(len(scripts))]
+            write("  script:\n")
+            for name, script in zip(names, scripts):
+                write(f"    - match: {quote(script.pattern)}\n")
+                write(f"      name: {quote(name)}\n")
+                write(f"      type: {script.rule_type.replace('http-', '')}\n")
+                write(f"      require-body: {'true' if script.requires_body else 'false'}\n")
+                write("      max-size: -1\n")
+                write("      timeout: 60\n")
+            
+            write("\nscript-providers:\n")
+            for name, script in zip(names, scripts):
+                write(f"  {quote(name)}:\n")
+                write(f"    url: {quote(script.script_path)}\n")
+                write("    interval: 86400\n")
+    
+    def quote(self, value):
+        """Single-quoted YAML scalar"""
+        return "'" + str(value).replace("'", "''") + "'"
+
 class ScriptConverter:
     def __init__(self):
         self.github_repo = "Mikephie/AutomatedJS"
         
+        # Outputs go to <output_root>/Loon, <output_root>/Surge, ...; "" is the CWD
+        self.output_root = ""
+        
+        # Incremental build state
+        self.manifest_path = MANIFEST_FILE
+        self.manifest = None
+        self.force = False
+        
+        # Module catalog kept up to date with every conversion, off unless catalog_path is set
+        self.catalog_path = None
+        self.catalog_sqlite = None
+        self.catalog = None
+        
+        # Emit scripts that only replace body text or JSON fields as native body rewrites
+        self.compile_bodies = False
+        
+        # Move runs of at least rule_set_min same-policy rules into shared rule-set files
+        # referenced as <rule_set_url>/<file>; off while rule_set_min is None
+        self.rule_set_min = None
+        self.rule_set_url = None
+        
+        # Share byte-identical outputs between sources: None, "hardlink" or "manifest"
+        self.dedup = None
+        
+        # Output targets, every registered emitter by default
+        self.targets = list(EMITTERS)
+        
+        # Check mode writes nothing and collects outputs that would change
+        self.check = False
+        self.stale = []
+        self.created_dirs = set()
+        
+        # Per-stage profiling, keyed by file name; file_stages is the file being converted
+        self.profile = False
+        self.profile_path = None
+        self.profile_top = 10
+        self.profiles = {}
+        self.file_stages = None
+        
+        # Parallel conversion; log_records buffers messages inside workers
+        self.jobs = os.cpu_count() or 1
+        self.log_records = None
+        
         # Default values when info can't be extracted
         self.defaults = {
             "desc": "模块",
@@ -30,11 +588,28 @@ class ScriptConverter:
         self.stats = {
             "success": 0,
             "failed": 0,
-            "skipped": 0
+            "skipped": 0,
+            "unchanged": 0,
+            "pruned": 0,
+            "written": 0,
+            "deduplicated": 0,
+            "compiled": 0,
+            "rule_sets": 0,
+            "guessed_hostnames": 0
         }
     
+    def stage(self, name):
+        """Timer for one stage of the current file, a no-op unless profiling"""
+        if self.file_stages is None:
+            return NULL_STAGE
+        return StageTimer(self.file_stages, name)
+    
     def log(self, message, level="INFO"):
         """Unified logging function"""
+        if self.log_records is not None:
+            self.log_records.append((level, message))
+            return
+        
         if level == "INFO":
             logger.info(message)
         elif level == "ERROR":
@@ -44,27 +619,88 @@ class ScriptConverter:
         else:
             logger.debug(message)
     
-    def extract_script_content(self, content):
-        """Extract content from comment block"""
-        comment_match = re.search(r'/\*([\s\S]*?)\*/', content)
-        if comment_match:
-            return comment_match.group(1).strip()
-        return content
-    
-    def extract_all_info(self, file_path):
-        """Extract all needed info from script file"""
+    def read_comment_block(self, stream, encoding):
+        """Decode a binary stream incrementally, stopping once the first comment block closes"""
+        # TextIOWrapper decodes chunk by chunk and applies universal newlines like open()
+        reader = io.TextIOWrapper(stream, encoding=encoding)
         try:
-            # First try UTF-8 encoding
+            content = ""
+            start = -1
+            scan_from = 0
+            
+            while True:
+                chunk = reader.read(HEADER_CHUNK_SIZE)
+                content += chunk
+                
+                if start < 0:
+                    start = content.find('/*', scan_from)
+                    # Resume one character back in case a marker straddles chunks
+                    scan_from = start + 2 if start >= 0 else max(0, len(content) - 1)
+                
+                if start >= 0:
+                    end = content.find('*/', scan_from)
+                    if end >= 0:
+                        return content[start + 2:end].strip()
+                    scan_from = max(start + 2, len(content) - 1)
+                
+                if not chunk:
+                    # No complete comment block, use the whole script
+                    return content
+        finally:
+            # Leave the underlying stream open for the caller
+            reader.detach()
+    
+    def read_header(self, file_path):
+        """Read only the config comment block of a script file"""
+        return self.read_source(file_path, hashed=False)[0]
+    
+    def read_source(self, file_path, hashed=True):
+        """(comment block, sha256 of the file, stat) from one chunked pass over a script
+        
+        The header is decoded as the chunks stream by, first as UTF-8, then as
+        latin-1. When hashed, the rest of the file is only fed to the digest,
+        never kept. Without hashed the read stops at the end of the header and
+        the hash is None. The stat is taken before the read, so an edit racing
+        it leaves a stale mtime and the next run rehashes instead of trusting it.
+        """
+        with self.stage("read") as stage:
+            stat = os.stat(file_path)
+            for encoding in ('utf-8', 'latin-1'):
+                digest = hashlib.sha256() if hashed else None
+                with open(file_path, 'rb') as file:
+                    stream = io.BufferedReader(HashingReader(file, digest), HEADER_CHUNK_SIZE) if hashed else file
+                    try:
+                        content = self.read_comment_block(stream, encoding)
+                    except UnicodeDecodeError:
+                        # Fall back to another encoding if UTF-8 fails
+                        continue
+                    if hashed:
+                        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                            digest.update(chunk)
+                    stage.bytes = file.tell()
+                return content, digest.hexdigest() if hashed else None, stat
+    
+    def decode_header(self, data):
+        """Comment block of in-memory script bytes, with the same encoding fallback as read_header"""
+        with self.stage("read") as stage:
+            stage.bytes = len(data)
             try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
+                return self.read_comment_block(io.BytesIO(data), 'utf-8')
             except UnicodeDecodeError:
-                # Fall back to another encoding if UTF-8 fails
-                with open(file_path, 'r', encoding='latin-1') as file:
-                    content = file.read()
-            
-            # Process comment block
-            content = self.extract_script_content(content)
+                return self.read_comment_block(io.BytesIO(data), 'latin-1')
+    
+    def extract_all_info(self, file_path, data=None, header=None):
+        """Extract all needed info from script file, from its bytes when data is given,
+        or from a header already read by read_source
+        """
+        try:
+            # Stream the comment block without reading the script body
+            if header is not None:
+                content = header
+            elif data is not None:
+                content = self.decode_header(data)
+            else:
+                content = self.read_header(file_path)
             
             # Get basic file info
             filename = os.path.basename(file_path)
@@ -72,71 +708,225 @@ class ScriptConverter:
             
             # Parse full script structure
             script_info = self.parse_script(content, scriptname)
+            if self.rule_set_min is not None:
+                script_info.rule_sets = find_rule_sets(script_info.rules, self.rule_set_min)
+            
+            if self.compile_bodies:
+                self.compile_body_rewrites(script_info, self.script_text(file_path, data))
             
             return script_info
         except Exception as e:
             self.log(f"Error processing {file_path}: {str(e)}", "ERROR")
             return None
     
+    def iter_script_infos(self, source, recursive=False, subdir=""):
+        """Yield (name, data, ScriptInfo) of every parsable script of a folder, archive or git:REPO@REF spec
+        
+        Folder scripts are named by their path and parsed from the streamed header,
+        data is then None; scripts of other providers carry their bytes. Raises
+        ProviderError when the source cannot be read.
+        """
+        if os.path.isdir(source):
+            directory = os.path.join(source, subdir) if subdir else source
+            scripts = ((path, None) for path in iter_script_paths(directory, recursive))
+        else:
+            scripts = ((script.name, script.data) for script in open_provider(source, subdir=subdir).sources())
+        for name, data in scripts:
+            info = self.extract_all_info(name, data)
+            if info is not None:
+                yield name, data, info
+    
+    def convert(self, text, targets=None, scriptname="script"):
+        """Convert script text in memory, returning {target: module text}
+        
+        Nothing is read from or written to disk; targets defaults to self.targets.
+        Options apply as for files, so with rule_set_min set the modules carry the
+        same RULE-SET references the CLI writes, but the rule-set files themselves
+        are left to a converter run that publishes them.
+        """
+        targets = list(targets or self.targets)
+        unknown = [target for target in targets if target not in EMITTERS]
+        if unknown:
+            raise ValueError(f"unknown target(s): {', '.join(unknown)}")
+        
+        # Same header extraction as for files, newline handling included
+        content = self.read_comment_block(io.BytesIO(text.encode('utf-8')), 'utf-8')
+        info = self.parse_script(content, scriptname)
+        if self.rule_set_min is not None:
+            info.rule_sets = find_rule_sets(info.rules, self.rule_set_min)
+        if self.compile_bodies:
+            self.compile_body_rewrites(info, text)
+        return {target: EMITTERS[target](self).render(info) for target in targets}
+    
+    def decode_source(self, data):
+        """Whole script text, with the same encoding fallback as read_header"""
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return data.decode('latin-1')
+    
+    def script_text(self, file_path, data=None):
+        """Whole text of a script, read from file_path unless its bytes are given"""
+        if data is None:
+            with open(file_path, 'rb') as file:
+                data = file.read()
+        return self.decode_source(data)
+    
+    def compile_body_rewrites(self, info, source):
+        """Replace the file's own response-body script by a native body rewrite when it reduces to one"""
+        with self.stage("body") as stage:
+            stage.bytes = len(source)
+            try:
+                script_path = body_script_path(info)
+                body_rewrite = compile_body(source)
+            except NotCompilable as e:
+                self.log(f"Keeping script of {info.filename}: {str(e)}", "DEBUG")
+                return None
+        
+        info.body_rewrites[script_path] = body_rewrite
+        dropped = f", dropping {len(body_rewrite.dropped)} notification statement(s)" if body_rewrite.dropped else ""
+        self.log(f"Compiled {info.filename} into a native {body_rewrite.kind} body rewrite{dropped}")
+        return body_rewrite
+    
     def parse_script(self, content, scriptname):
         """Parse complete script structure, preserving comments and format"""
+        # Walk the header once and reuse the tokens for every extractor
+        with self.stage("tokenize") as stage:
+            stage.bytes = len(content)
+            tokens = self.tokenize_header(content)
+        
         # Initialize result
-        result = {
-            "metadata": self.extract_metadata(content, scriptname),
-            "rules": [],
-            "rewrites": [],
-            "scripts": [],
-            "hostname": "",
-            "filename": scriptname,
-            "raw_content": content
-        }
+        with self.stage("metadata"):
+            result = ScriptInfo(scriptname, self.extract_metadata(content, scriptname, tokens))
         
         # Extract sections
-        self.extract_sections(content, result)
+        with self.stage("sections") as stage:
+            stage.bytes = sum(len(body) for body in tokens["sections"].values())
+            self.extract_sections(content, result, tokens)
         
-        # Extract hostname
-        result["hostname"] = self.extract_hostname(content)
+        # Extract hostname, deduplicated and without entries a wildcard already covers
+        with self.stage("hostname"):
+            hostnames, result.hostname_dropped = minimize_hostnames(
+                split_hostnames(self.extract_hostname(content, result, tokens)))
+            result.hostname = ", ".join(hostnames)
+            if result.hostname_source in ("guess", "default"):
+                # Counted into the run summary, most scripts leave their hostname to a guess
+                self.log(f"No hostname in {scriptname}, using {result.hostname_source} {result.hostname}", "DEBUG")
         
         return result
     
-    def extract_sections(self, content, result):
-        """Extract all sections including comments"""
-        # Try to extract Loon format sections
-        loon_sections = {
-            "Rule": re.search(r'\[Rule\]([\s\S]*?)(?=\[|$)', content, re.IGNORECASE),
-            "Rewrite": re.search(r'\[Rewrite\]([\s\S]*?)(?=\[|$)', content, re.IGNORECASE),
-            "Script": re.search(r'\[Script\]([\s\S]*?)(?=\[|$)', content, re.IGNORECASE)
-        }
+    def tokenize_header(self, content):
+        """Scan the header once, collecting section bodies, metadata values and hostname lines
         
-        # Try to extract QX format sections
-        qx_sections = {
-            "filter_local": re.search(r'\[filter_local\]([\s\S]*?)(?=\[|$)', content, re.IGNORECASE),
-            "rewrite_local": re.search(r'\[rewrite_local\]([\s\S]*?)(?=\[|$)', content, re.IGNORECASE)
+        Matches the first occurrence semantics of the per-key regexes this replaces:
+        a section runs until the next '[', and values run until the end of their line.
+        """
+        tokens = {
+            "sections": {},
+            "metadata": {},
+            "mitm_hostname": None,
+            "hostname": None,
+            "scroll_name": None
         }
+        mitm_start = mitm_end = -1
+        
+        for marker in HEADER_TOKEN_RE.finditer(content):
+            start = marker.start()
+            kind = marker.group()
+            
+            if kind == '[':
+                match = SECTION_TOKEN_RE.match(content, start)
+                if not match:
+                    continue
+                section = match.group(1)
+                name = section.lower()
+                if name in tokens["sections"] or (name == "mitm" and mitm_start >= 0):
+                    continue
+                # [MITM] lookup is case sensitive apart from the all-lowercase form
+                if name == "mitm" and section not in ("MITM", "mitm"):
+                    continue
+                
+                end = content.find('[', match.end())
+                end = end if end >= 0 else len(content)
+                if name == "mitm":
+                    mitm_start, mitm_end = match.end(), end
+                else:
+                    tokens["sections"][name] = content[match.end():end]
+            
+            elif kind == '#!':
+                match = METADATA_TOKEN_RE.match(content, start)
+                if not match:
+                    continue
+                key = match.group(1).lower()
+                if key not in tokens["metadata"]:
+                    value = self.token_line_value(content, match, content.index('=', start) + 1)
+                    if value is not None:
+                        tokens["metadata"][key] = value
+            
+            elif kind == 'hostname':
+                match = HOSTNAME_TOKEN_RE.match(content, start)
+                if not match:
+                    continue
+                equals = content.index('=', start) + 1
+                if tokens["mitm_hostname"] is None and mitm_start <= start < mitm_end:
+                    tokens["mitm_hostname"] = self.token_hostname_value(content, match, equals, mitm_end)
+                if tokens["hostname"] is None:
+                    tokens["hostname"] = self.token_hostname_value(content, match, equals, len(content))
+            
+            elif tokens["scroll_name"] is None:
+                match = SCROLL_TOKEN_RE.match(content, start)
+                tokens["scroll_name"] = self.token_line_value(content, match, start + len(kind))
+        
+        return tokens
+    
+    def token_line_value(self, content, match, value_start):
+        """Value of a `key = value` token up to the end of its line, None if no line end follows"""
+        line_end = LINE_END_RE.search(content, match.end())
+        if line_end:
+            return content[match.end():line_end.start()].strip()
+        
+        # The whitespace the token swallowed may itself hold the line end
+        if LINE_END_RE.search(content, value_start, match.end()):
+            return ""
+        return None
+    
+    def token_hostname_value(self, content, match, value_start, limit):
+        """Non-empty rest of a hostname line before limit, None if nothing can match"""
+        if match.end() < limit:
+            line_end = LINE_END_RE.search(content, match.end(), limit)
+            return content[match.end():line_end.start() if line_end else limit].strip()
+        
+        # Only whitespace is left, which matches unless it is all line breaks
+        if any(char not in '\n\r' for char in content[value_start:match.end()]):
+            return ""
+        return None
+    
+    def extract_sections(self, content, result, tokens=None):
+        """Extract all sections including comments"""
+        sections = (tokens or self.tokenize_header(content))["sections"]
         
         # Process Loon format
-        if loon_sections["Rule"] and loon_sections["Rule"].group(1):
-            self.parse_section_with_comments(loon_sections["Rule"].group(1), result["rules"])
+        if sections.get("rule"):
+            self.parse_section_with_comments(sections["rule"], result.rules, self.parse_loon_rule)
         
-        if loon_sections["Rewrite"] and loon_sections["Rewrite"].group(1):
-            self.parse_section_with_comments(loon_sections["Rewrite"].group(1), result["rewrites"])
+        if sections.get("rewrite"):
+            self.parse_section_with_comments(sections["rewrite"], result.rewrites, self.parse_loon_rewrite)
         
-        if loon_sections["Script"] and loon_sections["Script"].group(1):
-            self.parse_section_with_comments(loon_sections["Script"].group(1), result["scripts"])
+        if sections.get("script"):
+            self.parse_section_with_comments(sections["script"], result.scripts, self.parse_loon_script)
         
         # If no Loon format found, try QX format
-        if not result["rules"] and qx_sections["filter_local"] and qx_sections["filter_local"].group(1):
-            self.parse_qx_filter(qx_sections["filter_local"].group(1), result)
+        if not result.rules and sections.get("filter_local"):
+            self.parse_qx_filter(sections["filter_local"], result)
         
-        if not (result["rewrites"] or result["scripts"]) and qx_sections["rewrite_local"] and qx_sections["rewrite_local"].group(1):
-            self.parse_qx_rewrite(qx_sections["rewrite_local"].group(1), result)
+        if not (result.rewrites or result.scripts) and sections.get("rewrite_local"):
+            self.parse_qx_rewrite(sections["rewrite_local"], result)
     
-    def parse_section_with_comments(self, section_content, target_array):
-        """Parse section content, preserving comments"""
-        lines = section_content.split('\n')
+    def iter_section_lines(self, section_content):
+        """Yield (line, comment) for each content line, pairing it with the comment above it"""
         current_comment = ""
         
-        for line in lines:
+        for line in section_content.split('\n'):
             line = line.strip()
             if not line:
                 continue
@@ -145,84 +935,97 @@ class ScriptConverter:
                 # Collect comment
                 current_comment = line
             else:
-                # Process content line
-                target_array.append({
-                    "content": line,
-                    "comment": current_comment
-                })
+                yield line, current_comment
                 # Reset comment
                 current_comment = ""
     
+    def parse_section_with_comments(self, section_content, target_array, parse_line):
+        """Parse section content, preserving comments"""
+        for line, comment in self.iter_section_lines(section_content):
+            target_array.append(parse_line(line, comment))
+    
+    def parse_loon_rule(self, line, comment):
+        """Loon rule line, kept verbatim"""
+        parts = [part.strip() for part in line.split(',')]
+        return Entry("rule", rule_type=parts[0], pattern=parts[1] if len(parts) > 1 else None,
+                     action=parts[2] if len(parts) > 2 else None, comment=comment, text=line)
+    
+    def parse_loon_rewrite(self, line, comment):
+        """Loon rewrite line, kept verbatim; only `pattern - reject...` lines carry an action"""
+        if ' - reject' in line:
+            parts = line.split(' - ')
+            return Entry("rewrite", pattern=parts[0], action=parts[1], comment=comment, text=line)
+        return Entry("rewrite", pattern=line.split(' ')[0], comment=comment, text=line)
+    
+    def parse_loon_script(self, line, comment):
+        """Loon script line, kept verbatim; the path is only set when the line is well formed"""
+        entry = Entry("script", requires_body="requires-body=true" in line, comment=comment, text=line)
+        match = LOON_SCRIPT_RE.search(line)
+        if match:
+            entry.rule_type, entry.pattern, entry.script_path = match.groups()
+        else:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].startswith('http-'):
+                entry.rule_type, entry.pattern = parts[0], parts[1]
+        
+        tag_match = LOON_TAG_RE.search(line)
+        if tag_match:
+            entry.tag = tag_match.group(1)
+        return entry
+    
     def parse_qx_filter(self, filter_content, result):
         """Parse QX filter rules, convert to Loon format"""
-        self.parse_section_with_comments(filter_content, result["rules"])
-        
-        # Convert QX rules to Loon format
-        for i, rule in enumerate(result["rules"]):
-            content = rule["content"]
-            
+        for line, comment in self.iter_section_lines(filter_content):
             # Convert format
-            if content.startswith('host,'):
-                parts = content.split(',')
-                if len(parts) >= 3:
-                    result["rules"][i]["content"] = f"DOMAIN,{parts[1]},{parts[2]}"
-            elif content.startswith('url-regex,'):
-                parts = content.split(',')
-                if len(parts) >= 3:
-                    result["rules"][i]["content"] = f"URL-REGEX,{parts[1]},{parts[2]}"
+            parts = line.split(',')
+            if line.startswith('host,') and len(parts) >= 3:
+                result.rules.append(Entry("rule", "DOMAIN", parts[1], parts[2], comment=comment))
+            elif line.startswith('url-regex,') and len(parts) >= 3:
+                result.rules.append(Entry("rule", "URL-REGEX", parts[1], parts[2], comment=comment))
+            else:
+                result.rules.append(self.parse_loon_rule(line, comment))
     
     def parse_qx_rewrite(self, rewrite_content, result):
         """Parse QX rewrite rules, split between Loon Rewrite and Script sections"""
-        lines = rewrite_content.split('\n')
-        current_comment = ""
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
+        for line, comment in self.iter_section_lines(rewrite_content):
+            if ' url ' not in line:
                 continue
             
-            if line.startswith('#'):
-                # Collect comment
-                current_comment = line
-            elif ' url ' in line:
-                parts = line.split(' url ')
-                pattern = parts[0].strip()
-                action = parts[1].strip()
-                
-                if action.startswith('reject'):
-                    # reject rules go to Rewrite
-                    result["rewrites"].append({
-                        "content": f"{pattern} - {action}",
-                        "comment": current_comment
-                    })
-                elif action.startswith('script-'):
-                    # script rules go to Script
-                    script_parts = action.split(' ')
-                    if len(script_parts) >= 2:
-                        script_type = script_parts[0]
-                        script_path = script_parts[1]
-                        
-                        # Determine type
-                        http_type = "http-response" if "response" in script_type else "http-request"
-                        requires_body = "true" if "body" in script_type else "false"
-                        
-                        # Extract script name for tag
-                        tag = result["metadata"]["name"]
-                        if script_path and '/' in script_path:
-                            script_name = script_path.split('/')[-1].split('.')[0]
-                            if script_name:
-                                tag = script_name
-                        
-                        result["scripts"].append({
-                            "content": f"{http_type} {pattern} script-path={script_path}, requires-body={requires_body}, timeout=60, tag={tag}",
-                            "comment": current_comment
-                        })
-                
-                # Reset comment
-                current_comment = ""
+            parts = line.split(' url ')
+            pattern = parts[0].strip()
+            action = parts[1].strip()
+            
+            if action.startswith('reject'):
+                # reject rules go to Rewrite
+                result.rewrites.append(Entry("rewrite", pattern=pattern, action=action, comment=comment))
+            elif action.startswith('script-'):
+                # script rules go to Script
+                script_parts = action.split(' ')
+                if len(script_parts) >= 2:
+                    script_type = script_parts[0]
+                    script_path = script_parts[1]
+                    
+                    # Extract script name for tag
+                    tag = result.metadata["name"]
+                    if script_path and '/' in script_path:
+                        script_name = script_path.split('/')[-1].split('.')[0]
+                        if script_name:
+                            tag = script_name
+                    
+                    result.scripts.append(Entry(
+                        "script",
+                        rule_type="http-response" if "response" in script_type else "http-request",
+                        pattern=pattern,
+                        action=script_type,
+                        script_path=script_path,
+                        requires_body="body" in script_type,
+                        tag=tag,
+                        comment=comment
+                    ))
     
-    def extract_metadata(self, content, scriptname):
+    def extract_metadata(self, content, scriptname, tokens=None):
         """Extract script metadata (name, desc, category, author, icon)"""
+        tokens = tokens or self.tokenize_header(content)
         metadata = {
             "name": scriptname,  # Default to script filename
             "desc": self.defaults["desc"],
@@ -231,256 +1034,708 @@ class ScriptConverter:
             "icon": f"https://raw.githubusercontent.com/Mikephie/icons/main/icon/{scriptname.lower()}.png"
         }
         
-        # Extract metadata from comments
-        patterns = {
-            "name": r'#!name\s*=\s*(.*?)[\n\r]',
-            "desc": r'#!desc\s*=\s*(.*?)[\n\r]',
-            "category": r'#!category\s*=\s*(.*?)[\n\r]',
-            "author": r'#!author\s*=\s*(.*?)[\n\r]',
-            "icon": r'#!icon\s*=\s*(.*?)[\n\r]'
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, content, re.IGNORECASE)
-            if match:
-                metadata[key] = match.group(1).strip()
+        # Metadata from #!key= comments
+        metadata.update(tokens["metadata"])
         
         # Try to guess name from content
         if metadata["name"] == scriptname:
-            name_match = re.search(r'📜\s*(.*?)[\n\r]', content)
-            if name_match:
-                metadata["name"] = name_match.group(1).strip()
+            if tokens["scroll_name"] is not None:
+                metadata["name"] = tokens["scroll_name"]
             else:
-                # Try to guess from content
-                for name_pattern in [r'彩云天气|caiyun|AXS Payment|([^\n]+脚本)']:
-                    title_match = re.search(name_pattern, content, re.IGNORECASE)
-                    if title_match:
-                        metadata["name"] = title_match.group(0).strip()
-                        break
+                guess = self.guess_name(content)
+                if guess is not None:
+                    metadata["name"] = guess.strip()
         
         return metadata
     
-    def extract_hostname(self, content):
+    def guess_name(self, content):
+        """Leftmost of a known title or a line ending in 脚本, without backtracking over long lines"""
+        title_match = NAME_GUESS_RE.search(content)
+        
+        # First line with 脚本 somewhere after its first character
+        position = content.find(NAME_GUESS_SUFFIX, 1)
+        while position >= 0:
+            line_start = content.rfind('\n', 0, position) + 1
+            if position > line_start:
+                break
+            position = content.find(NAME_GUESS_SUFFIX, position + 1)
+        
+        if position < 0 or (title_match and title_match.start() <= line_start):
+            return title_match.group(0) if title_match else None
+        
+        # The guess runs to the last 脚本 on that line
+        line_end = content.find('\n', position)
+        line_end = line_end if line_end >= 0 else len(content)
+        return content[line_start:content.rfind(NAME_GUESS_SUFFIX, position, line_end) + len(NAME_GUESS_SUFFIX)]
+    
+    def extract_hostname(self, content, result, tokens=None):
         """Extract MITM hostname"""
-        # Extract from [MITM] or [mitm] section
-        mitm_match = re.search(r'\[(MITM|mitm)\]([\s\S]*?)(?=\[|$)', content)
-        if mitm_match:
-            hostname_match = re.search(r'hostname\s*=\s*([^\n\r]+)', mitm_match.group(2))
-            if hostname_match:
-                return hostname_match.group(1).strip()
-        
-        # Extract from whole content
-        hostname_match = re.search(r'hostname\s*=\s*([^\n\r]+)', content)
-        if hostname_match:
-            return hostname_match.group(1).strip()
-        
-        # Try to extract domain from rules
-        domain_match = re.search(r'https?:\/\/([^\/\s]+)', content)
-        if domain_match:
-            domain = domain_match.group(1).replace('\\', '')
-            # If subdomain, convert to wildcard form
-            if domain.count('.') > 1:
-                parts = domain.split('.')
-                return f"*.{parts[-2]}.{parts[-1]}"
-            return domain
+        tokens = tokens or self.tokenize_header(content)
+        
+        # Extract from [MITM] or [mitm] section, then from the whole header
+        for key, source in (("mitm_hostname", "mitm"), ("hostname", "header")):
+            if tokens[key] is not None:
+                result.hostname_source = source
+                return tokens[key]
         
+        # Try to extract domain from the URL patterns of the parsed rules
+        result.hostname_source = "guess"
+        for pattern in self.entry_patterns(result):
+            domain_match = URL_HOST_RE.search(pattern.replace('\\', ''))
+            if domain_match and '.' in domain_match.group(1).strip('.'):
+                domain = domain_match.group(1).strip('.')
+                # If subdomain, convert to wildcard form
+                if domain.count('.') > 1:
+                    parts = domain.split('.')
+                    return f"*.{parts[-2]}.{parts[-1]}"
+                return domain
+        
+        result.hostname_source = "default"
         return "example.com"
     
+    def entry_patterns(self, result):
+        """Yield the URL pattern of each parsed rule, rewrite and script entry"""
+        for rule in result.rules:
+            if rule.pattern is not None:
+                if rule.rule_type.strip().upper() in ("DOMAIN", "HOST"):
+                    yield f"https://{rule.pattern.strip()}/"
+                else:
+                    yield rule.pattern.strip()
+        
+        for entry in result.rewrites + result.scripts:
+            if entry.pattern is not None:
+                yield entry.pattern
+    
     def create_loon_config(self, info):
         """Create Loon configuration"""
-        metadata = info["metadata"]
+        return EMITTERS["loon"](self).render(info)
+    
+    def create_surge_config(self, info):
+        """Create Surge configuration"""
+        return EMITTERS["surge"](self).render(info)
+    
+    def rule_set_directory(self):
+        return os.path.join(self.output_root, RULE_SET_DIRECTORY)
+    
+    def rule_set_reference_base(self):
+        """URL the rule-set directory is published under"""
+        base = self.rule_set_url or f"https://raw.githubusercontent.com/{self.github_repo}/main/{RULE_SET_DIRECTORY}"
+        return base.rstrip('/')
+    
+    def rule_set_reference(self, rule_set):
+        """URL modules use to download a rule set"""
+        return f"{self.rule_set_reference_base()}/{rule_set.filename}"
+    
+    def write_rule_sets(self, info, result):
+        """Write the rule-set files of info, recording their hashes in result["rule_sets"]"""
+        rule_sets = {}
+        for rule_set in info.rule_sets:
+            path = os.path.join(self.rule_set_directory(), rule_set.filename)
+            data = rule_set.data()
+            # Content-addressed, so a file shared with another module is only ever rewritten with the same bytes
+            if path not in rule_sets and self.write_output(path, data):
+                result["written"].append(path)
+            rule_sets[path] = self.hash_bytes(data)
+        result["rule_sets"] = rule_sets
+    
+    def prune_rule_sets(self):
+        """Remove rule-set files no module in the manifest references any more
         
-        # Basic config info
-        config = f"""#!name = {metadata["name"]}
-#!desc = {metadata["desc"]}
-#!category = {metadata["category"]}
-#!author = {metadata["author"]}
-#!icon = {metadata["icon"]}"""
+        Runs with rule sets turned off too: modules rebuilt without them drop
+        their references, and the files go once none is left.
+        """
+        directory = self.rule_set_directory()
+        if self.manifest is None or not os.path.isdir(directory):
+            return
         
-        # Add Rule section
-        if info["rules"]:
-            config += "\n\n[Rule]"
-            last_comment = ""
-            
-            for rule in info["rules"]:
-                # Add comment (if there's a new one)
-                if rule["comment"] and rule["comment"] != last_comment:
-                    config += f"\n{rule['comment']}"
-                    last_comment = rule["comment"]
-                
-                config += f"\n{rule['content']}"
+        referenced = set()
+        for entry in self.manifest["files"].values():
+            referenced.update(entry.get("rule_sets", {}))
+        self.stats["rule_sets"] = len(referenced)
         
-        # Add Rewrite section
-        if info["rewrites"]:
-            config += "\n\n[Rewrite]"
-            last_comment = ""
-            
-            for rewrite in info["rewrites"]:
-                # Add comment (if there's a new one)
-                if rewrite["comment"] and rewrite["comment"] != last_comment:
-                    config += f"\n{rewrite['comment']}"
-                    last_comment = rewrite["comment"]
-                
-                config += f"\n{rewrite['content']}"
+        with os.scandir(directory) as entries:
+            unused = sorted(entry.path for entry in entries
+                            if entry.name.endswith(RULE_SET_EXTENSION) and entry.path not in referenced)
+        for path in unused:
+            if self.check:
+                self.log(f"Stale: {path} (rule set no longer used)", "WARN")
+                self.stale.append(path)
+            else:
+                os.remove(path)
+                self.log(f"Removed unused rule set: {path}")
+    
+    def write_output(self, path, data):
+        """Atomically replace path with data unless it already holds exactly those bytes
         
-        # Add Script section
-        if info["scripts"]:
-            config += "\n\n[Script]"
-            last_comment = ""
-            
-            for script in info["scripts"]:
-                # Add comment (if there's a new one)
-                if script["comment"] and script["comment"] != last_comment:
-                    config += f"\n{script['comment']}"
-                    last_comment = script["comment"]
-                
-                config += f"\n{script['content']}"
+        Returns True when the file was (or, in check mode, would be) rewritten.
+        """
+        try:
+            if os.path.getsize(path) == len(data):
+                with open(path, 'rb') as file:
+                    if file.read() == data:
+                        return False
+        except OSError:
+            pass
         
-        # Add MITM section
-        if info["hostname"]:
-            config += f"\n\n[MITM]\nhostname = {info['hostname']}"
+        if self.check:
+            return True
         
-        return config
+        # Create output directory once per run
+        directory = os.path.dirname(path) or "."
+        if directory not in self.created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self.created_dirs.add(directory)
+        
+        # Write beside the target and rename, so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return True
     
-    def create_surge_config(self, info):
-        """Create Surge configuration"""
-        metadata = info["metadata"]
+    def hash_bytes(self, data):
+        """Return the content hash used by the build manifest"""
+        return hashlib.sha256(data).hexdigest()
+    
+    def hash_file(self, file_path):
+        """Hash a file in chunks without loading it whole"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(65536), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def build_options(self):
+        """Settings that change the generated outputs, besides the converter version and targets"""
+        options = {}
+        if self.compile_bodies:
+            options["compile_body_rewrites"] = True
+        if self.rule_set_min is not None:
+            options["rule_sets"] = {"min_rules": self.rule_set_min, "url": self.rule_set_reference_base()}
+        return options
+    
+    def load_manifest(self):
+        """Load the build manifest, discarding it if written by another converter version"""
+        self.manifest = {"version": CONVERTER_VERSION, "files": {}}
+        options = self.build_options()
+        if options:
+            self.manifest["options"] = options
+        if not os.path.isfile(self.manifest_path):
+            return self.manifest
         
-        # Basic config info
-        config = f"""#!name = {metadata["name"]}
-#!desc = {metadata["desc"]}
-#!category = {metadata["category"]}
-#!author = {metadata["author"]}"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            self.log(f"Ignoring unreadable manifest {self.manifest_path}: {str(e)}", "WARN")
+            return self.manifest
         
-        # Add Rule section
-        if info["rules"]:
-            config += "\n\n[Rule]"
-            last_comment = ""
-            
-            for rule in info["rules"]:
-                # Add comment
-                if rule["comment"] and rule["comment"] != last_comment:
-                    config += f"\n{rule['comment']}"
-                    last_comment = rule["comment"]
-                
-                config += f"\n{rule['content']}"
+        if data.get("version") != CONVERTER_VERSION or data.get("options", {}) != options:
+            if data.get("version") != CONVERTER_VERSION:
+                self.log(f"Manifest was written by converter {data.get('version')}, rebuilding all files")
+            else:
+                self.log("Manifest was written with other output options, rebuilding all files")
+            # Keep the output lists so deleted sources can still be pruned, and the rule sets
+            # their modules reference until they are rebuilt
+            for name, entry in data.get("files", {}).items():
+                self.manifest["files"][name] = {"outputs": entry.get("outputs", {})}
+                if entry.get("rule_sets"):
+                    self.manifest["files"][name]["rule_sets"] = entry["rule_sets"]
+            return self.manifest
         
-        # Add Map Local section (for reject rules)
-        reject_rules = [r for r in info["rewrites"] if ' - reject' in r["content"]]
-        if reject_rules:
-            config += "\n\n[Map Local]"
-            last_comment = ""
-            
-            for rule in reject_rules:
-                # Add comment
-                if rule["comment"] and rule["comment"] != last_comment:
-                    config += f"\n{rule['comment']}"
-                    last_comment = rule["comment"]
-                
-                # Extract pattern and reject type
-                parts = rule["content"].split(' - ')
-                pattern = parts[0]
-                reject_type = parts[1] if len(parts) > 1 else "reject"
-                
-                # Set Map Local parameters
-                data_type = "text"
-                data = "{}"
-                
-                if "img" in reject_type:
-                    data_type = "img"
-                elif "array" in reject_type:
-                    data = "[]"
-                
-                config += f"\n{pattern} data-type={data_type} data=\"{data}\" status-code=200"
+        self.manifest["files"] = data.get("files", {})
+        return self.manifest
+    
+    def save_manifest(self):
+        """Write the build manifest atomically"""
+        if self.manifest is None or self.check:
+            return
         
-        # Add Script section
-        if info["scripts"]:
-            config += "\n\n[Script]"
-            last_comment = ""
-            rule_counter = 0
-            
-            for script in info["scripts"]:
-                # Add comment
-                if script["comment"] and script["comment"] != last_comment:
-                    config += f"\n{script['comment']}"
-                    last_comment = script["comment"]
-                
-                # Parse Loon script rule
-                loon_script = script["content"]
-                match = re.search(r'(http-(?:response|request))\s+([^\s]+)\s+script-path=([^,]+)', loon_script)
-                
-                if match:
-                    http_type = match.group(1).replace('http-', '')
-                    pattern = match.group(2)
-                    script_path = match.group(3)
-                    
-                    # Determine if body is required
-                    requires_body = "true" if "requires-body=true" in loon_script else "false"
-                    
-                    # Generate Surge rule name
-                    rule_name = info["metadata"]["name"] if rule_counter == 0 else f"{info['metadata']['name']}_{rule_counter+1}"
-                    
-                    config += f"\n{rule_name} = type=http-{http_type}, pattern={pattern}, script-path={script_path}, requires-body={requires_body}, max-size=-1, timeout=60"
-                    
-                    rule_counter += 1
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.manifest, file, ensure_ascii=False, indent=2, sort_keys=True)
+            file.write("\n")
+        os.replace(temp_path, self.manifest_path)
+    
+    def load_catalog(self):
+        """Open the module catalog when one was requested"""
+        if self.catalog_path:
+            self.catalog = ModuleCatalog(self.catalog_path, CONVERTER_VERSION, self.catalog_sqlite)
+        return self.catalog
+    
+    def save_catalog(self):
+        """Write the module catalog and its SQLite mirror"""
+        if self.catalog is None or self.check:
+            return
+        self.catalog.save()
+        self.log(f"Catalog of {len(self.catalog.modules)} modules written to {self.catalog_path}", "DEBUG")
+    
+    def is_unchanged(self, file_path, data=None):
+        """Check the manifest to see if a source can be skipped
         
-        # Add MITM section
-        if info["hostname"]:
-            config += f"\n\n[MITM]\nhostname = %APPEND% {info['hostname']}"
+        data holds the bytes of sources that are not files on disk.
+        """
+        if self.force or self.check or self.manifest is None:
+            return False
+        
+        entry = self.manifest["files"].get(os.path.basename(file_path))
+        if not entry or "source_hash" not in entry:
+            return False
+        
+        # A catalog entry has to come from parsing the script
+        if self.catalog is not None and os.path.basename(file_path) not in self.catalog:
+            return False
+        
+        # Every target must have been built and still be present
+        scriptname = os.path.splitext(os.path.basename(file_path))[0]
+        expected = {EMITTERS[target](self).output_path(scriptname) for target in self.targets}
+        if not expected <= set(entry.get("outputs", {})):
+            return False
+        if not all(os.path.isfile(path) for path in expected):
+            return False
+        if not all(os.path.isfile(path) for path in entry.get("rule_sets", {})):
+            return False
         
-        return config
+        if data is not None:
+            return self.hash_bytes(data) == entry["source_hash"]
+        
+        # Cheap check first, hash only when the stat signature moved
+        stat = os.stat(file_path)
+        if entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+            return True
+        
+        if self.hash_file(file_path) != entry["source_hash"]:
+            return False
+        
+        entry["mtime_ns"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        return True
     
-    def process_file(self, file_path):
-        """Process a single file"""
-        try:
-            # Extract filename
-            filename = os.path.basename(file_path)
-            scriptname = os.path.splitext(filename)[0]
+    def record_file(self, result):
+        """Record a converted source and the hashes of its outputs in the manifest"""
+        if self.manifest is None or self.check:
+            return
+        
+        self.manifest["files"][os.path.basename(result["file"])] = {
+            "source_hash": result["source_hash"],
+            "mtime_ns": result["mtime_ns"],
+            "size": result["size"],
+            "outputs": result["outputs"]
+        }
+        if result.get("rule_sets"):
+            self.manifest["files"][os.path.basename(result["file"])]["rule_sets"] = result["rule_sets"]
+    
+    def prune_deleted(self, present_files):
+        """Remove outputs of sources that no longer exist"""
+        if self.manifest is None:
+            return
+        
+        present = {os.path.basename(path) for path in present_files}
+        if self.catalog is not None:
+            self.catalog.retain(present)
+        self.prune_names(set(self.manifest["files"]) - present)
+    
+    def prune_names(self, names):
+        """Remove the outputs and manifest entries of the given source file names"""
+        if self.manifest is None:
+            return
+        
+        for name in sorted(names):
+            if self.catalog is not None:
+                self.catalog.discard(name)
+            if name not in self.manifest["files"]:
+                continue
+            entry = self.manifest["files"].pop(name)
+            for output_path in entry.get("outputs", {}):
+                if not os.path.isfile(output_path):
+                    continue
+                if self.check:
+                    self.log(f"Stale: {output_path} (source deleted)", "WARN")
+                    self.stale.append(output_path)
+                else:
+                    os.remove(output_path)
+                    self.log(f"Removed stale output: {output_path}")
+            self.stats["pruned"] += 1
+    
+    def duplicate_outputs(self):
+        """Map each output to the first path holding the same bytes, per the manifest"""
+        groups = {}
+        for entry in self.manifest["files"].values():
+            for path, digest in entry.get("outputs", {}).items():
+                groups.setdefault(digest, []).append(path)
+        
+        aliases = {}
+        for paths in groups.values():
+            paths = sorted(path for path in set(paths) if os.path.isfile(path))
+            for path in paths[1:]:
+                aliases[path] = paths[0]
+        return aliases
+    
+    def dedup_outputs(self):
+        """Hardlink byte-identical outputs to one file, or list them in OUTPUT_DEDUP_FILE"""
+        if self.manifest is None or self.check or not self.dedup:
+            return
+        
+        aliases = self.duplicate_outputs()
+        if self.dedup == "manifest":
+            groups = {}
+            for path, canonical in sorted(aliases.items()):
+                groups.setdefault(canonical, []).append(path)
+            data = (json.dumps(groups, ensure_ascii=False, indent=2, sort_keys=True) + "\n").encode('utf-8')
+            self.write_output(os.path.join(self.output_root, OUTPUT_DEDUP_FILE), data)
+            self.stats["deduplicated"] = len(aliases)
+            return
+        
+        for path, canonical in sorted(aliases.items()):
+            if os.path.samefile(path, canonical):
+                continue
             
+            # Link next to the target first so the swap is atomic
+            temp_path = f"{path}.dedup-tmp"
+            try:
+                if os.path.lexists(temp_path):
+                    os.remove(temp_path)
+                os.link(canonical, temp_path)
+                os.replace(temp_path, path)
+            except OSError as e:
+                self.log(f"Could not hardlink {path} to {canonical}: {str(e)}", "WARN")
+                return
+            self.log(f"Linked {path} to identical {canonical}", "DEBUG")
+            self.stats["deduplicated"] += 1
+    
+    def convert_file(self, file_path, info=None, data=None, source=None):
+        """Convert a single file and return a picklable result record
+        
+        data holds the bytes of a source that is not on disk, file_path then only
+        names it. source is the (header, hash, stat) of an earlier read_source and
+        info may carry the ScriptInfo parsed from that header or data. The manifest
+        records the hash of exactly the bytes the outputs were built from.
+        """
+        filename = os.path.basename(file_path)
+        scriptname = os.path.splitext(filename)[0]
+        result = {"file": file_path, "status": "failed", "outputs": {}, "written": []}
+        if self.profile:
+            self.file_stages = result["profile"] = {}
+        
+        try:
             self.log(f"Processing: {filename}")
             
-            # Extract info
-            info = self.extract_all_info(file_path)
+            if data is None:
+                header, source_hash, stat = source or self.read_source(file_path)
+                signature = {"source_hash": source_hash, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+                info = info or self.extract_all_info(file_path, header=header)
+            else:
+                signature = {"source_hash": self.hash_bytes(data), "mtime_ns": None, "size": len(data)}
+                info = info or self.extract_all_info(file_path, data)
+            
             if not info:
                 self.log(f"Could not extract info from {filename}, skipping", "WARN")
-                self.stats["skipped"] += 1
-                return False
-            
-            # Create output directories if they don't exist
-            os.makedirs("Loon", exist_ok=True)
-            os.makedirs("Surge", exist_ok=True)
+                result["status"] = "skipped"
+                return result
             
-            # Create configs
-            loon_config = self.create_loon_config(info)
-            surge_config = self.create_surge_config(info)
-            
-            # Save files
-            loon_path = f"Loon/{scriptname}.plugin"
-            surge_path = f"Surge/{scriptname}.sgmodule"
-            
-            with open(loon_path, 'w', encoding='utf-8') as file:
-                file.write(loon_config)
+            # Emit every target from the single parse
+            outputs = {}
+            for target in self.targets:
+                emitter = EMITTERS[target](self)
+                output_path = emitter.output_path(scriptname)
+                with self.stage(f"emit:{target}") as stage:
+                    rendered = emitter.render(info).encode('utf-8')
+                    stage.bytes = len(rendered)
+                
+                # Only touch outputs whose bytes changed
+                with self.stage(f"write:{target}") as stage:
+                    if self.write_output(output_path, rendered):
+                        result["written"].append(output_path)
+                        stage.bytes = len(rendered)
+                outputs[output_path] = self.hash_bytes(rendered)
             
-            with open(surge_path, 'w', encoding='utf-8') as file:
-                file.write(surge_config)
+            if info.rule_sets:
+                with self.stage("write:rule_sets"):
+                    self.write_rule_sets(info, result)
             
-            self.log(f"Successfully created: {loon_path} and {surge_path}")
-            self.stats["success"] += 1
-            return True
+            result.update(signature, status="success", outputs=outputs)
+            if self.catalog_path:
+                result["catalog"] = catalog_entry(info, outputs)
+            result["compiled"] = len(info.body_rewrites)
+            result["guessed_hostname"] = info.hostname_source in ("guess", "default")
             
+            if self.check:
+                for output_path in result["written"]:
+                    self.log(f"Stale: {output_path}", "WARN")
+            elif result["written"]:
+                self.log(f"Successfully created: {' and '.join(result['written'])}")
+            else:
+                self.log(f"Up to date: {' and '.join(outputs)}", "DEBUG")
+            return result
+        
         except Exception as e:
             self.log(f"Error processing {file_path}: {str(e)}", "ERROR")
-            self.stats["failed"] += 1
+            return result
+        finally:
+            self.file_stages = None
+    
+    def apply_result(self, result):
+        """Merge a conversion result into logs, statistics and the manifest"""
+        for level, message in result.get("logs", []):
+            self.log(message, level)
+        
+        if "profile" in result:
+            self.profiles[os.path.basename(result["file"])] = result["profile"]
+        
+        self.stats[result["status"]] += 1
+        if result["status"] == "success":
+            self.record_file(result)
+            self.stats["compiled"] += result["compiled"]
+            self.stats["guessed_hostnames"] += result["guessed_hostname"]
+            if self.catalog is not None:
+                self.catalog.update(os.path.basename(result["file"]), result["catalog"])
+            if self.check:
+                self.stale.extend(result["written"])
+            else:
+                self.stats["written"] += len(result["written"])
+        return result["status"] == "success"
+    
+    def process_file(self, file_path):
+        """Process a single file"""
+        if self.is_unchanged(file_path):
+            self.log(f"Unchanged: {os.path.basename(file_path)}", "DEBUG")
+            self.stats["unchanged"] += 1
+            return True
+        
+        return self.apply_result(self.convert_file(file_path))
+    
+    def worker_options(self):
+        """Settings a worker process needs to rebuild this converter"""
+        return {
+            "github_repo": self.github_repo,
+            "output_root": self.output_root,
+            "defaults": self.defaults,
+            "targets": self.targets,
+            "check": self.check,
+            "compile_bodies": self.compile_bodies,
+            "rule_set_min": self.rule_set_min,
+            "rule_set_url": self.rule_set_url,
+            "catalog_path": self.catalog_path,
+            "profile": self.profile
+        }
+    
+    def process_files(self, file_paths):
+        """Convert files, fanning out to worker processes when jobs > 1"""
+        pending = []
+        for file_path in file_paths:
+            if self.is_unchanged(file_path):
+                self.log(f"Unchanged: {os.path.basename(file_path)}", "DEBUG")
+                self.stats["unchanged"] += 1
+            else:
+                pending.append(file_path)
+        
+        jobs = min(self.jobs, len(pending))
+        if jobs <= 1:
+            for file_path in pending:
+                self.apply_result(self.convert_file(file_path))
+            return
+        
+        self.log(f"Converting {len(pending)} files with {jobs} workers")
+        chunksize = max(1, len(pending) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(self.worker_options(),)) as executor:
+            # map() yields in submission order, so logs do not depend on scheduling
+            for result in executor.map(_convert_in_worker, pending, chunksize=chunksize):
+                self.apply_result(result)
+    
+    def write_profile_report(self, wall_seconds):
+        """Write the JSON timing report for the files converted in this run"""
+        report = build_profile_report(self.profiles, wall_seconds, self.profile_top)
+        report["jobs"] = self.jobs
+        with open(self.profile_path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+            file.write("\n")
+        
+        slowest = ", ".join(f"{item['file']} ({item['total_ms']} ms)" for item in report["slowest"][:3])
+        self.log(f"Profile of {report['files']} files written to {self.profile_path}; slowest: {slowest or 'none'}")
+    
+    def scan_sources(self, directory):
+        """Stat signature of every script in a directory"""
+        snapshot = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.js') and entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+    
+    def wait_for_quiet(self, directory, snapshot, debounce, max_wait):
+        """Rescan until a burst of saves settles, returning the final snapshot"""
+        deadline = time.monotonic() + max_wait
+        while time.monotonic() < deadline:
+            time.sleep(debounce)
+            current = self.scan_sources(directory)
+            if current == snapshot:
+                break
+            snapshot = current
+        return snapshot
+    
+    def apply_changes(self, parsed, previous, current):
+        """Reconvert added and modified scripts, prune deleted ones"""
+        started = time.perf_counter()
+        touched = sorted(path for path in current if previous.get(path) != current[path])
+        removed = sorted(set(previous) - set(current))
+        
+        # Renames arrive as a removal plus an addition
+        for file_path in removed:
+            parsed.pop(file_path, None)
+            self.log(f"Removed: {os.path.basename(file_path)}")
+        if removed:
+            self.prune_deleted(current)
+        
+        converted = 0
+        for file_path in touched:
+            try:
+                source = self.read_source(file_path)
+            except OSError as e:
+                self.log(f"Error reading {file_path}: {str(e)}", "ERROR")
+                continue
+            info = self.extract_all_info(file_path, header=source[0])
+            if info is not None and info == parsed.get(file_path):
+                # Only the script body changed, the generated modules cannot differ
+                self.log(f"Header unchanged: {os.path.basename(file_path)}", "DEBUG")
+                continue
+            
+            converted += 1
+            result = self.convert_file(file_path, info, source=source)
+            if self.apply_result(result):
+                parsed[file_path] = info
+            else:
+                parsed.pop(file_path, None)
+        
+        self.prune_rule_sets()
+        self.save_manifest()
+        self.save_catalog()
+        elapsed = (time.perf_counter() - started) * 1000
+        self.log(f"Reconverted {converted} of {len(touched)} changed, pruned {len(removed)} deleted file(s) in {elapsed:.1f} ms")
+    
+    def watch_directory(self, directory, interval=0.5, debounce=0.1, max_wait=2.0):
+        """Convert the directory, then poll it and reconvert scripts as they change"""
+        self.process_directory(directory)
+        if not os.path.isdir(directory):
+            return False
+        
+        # Parsed state of every script, used to skip edits that leave the header alone
+        snapshot = self.scan_sources(directory)
+        parsed = {path: self.extract_all_info(path) for path in snapshot}
+        self.log(f"Watching {directory} for changes (Ctrl+C to stop)")
+        
+        try:
+            while True:
+                time.sleep(interval)
+                current = self.scan_sources(directory)
+                if current == snapshot:
+                    continue
+                
+                current = self.wait_for_quiet(directory, current, debounce, max_wait)
+                self.apply_changes(parsed, snapshot, current)
+                snapshot = current
+        except KeyboardInterrupt:
+            self.log("Stopped watching")
+        return True
+    
+    def unique_by_name(self, paths):
+        """Paths whose file name was not taken by an earlier one; outputs are named after it alone"""
+        seen = set()
+        unique = []
+        for path in paths:
+            filename = os.path.basename(path)
+            if filename in seen:
+                self.log(f"Skipping {path}: another {filename} was already converted", "WARN")
+                self.stats["skipped"] += 1
+                continue
+            seen.add(filename)
+            unique.append(path)
+        return unique
+    
+    def process_sources(self, provider):
+        """Convert the scripts of an input provider (archive, git objects, directory tree)
+        
+        Sources are converted from memory as the provider yields them. A provider
+        that lists only changed scripts prunes just the ones it reports deleted.
+        """
+        self.log(f"Starting to process {provider.describe()}")
+        started = time.perf_counter()
+        
+        self.load_manifest()
+        self.load_catalog()
+        
+        seen = set()
+        try:
+            self.convert_sources(self.pending_sources(provider, seen))
+        except ProviderError as e:
+            # Keep what was converted before the source broke off, prune nothing
+            self.log(str(e), "ERROR")
+            self.save_manifest()
             return False
+        
+        if provider.complete:
+            self.prune_deleted(seen)
+        else:
+            self.prune_names(set(provider.deleted) - seen)
+        self.dedup_outputs()
+        return self.finish_run(started)
+    
+    def pending_sources(self, provider, seen):
+        """Sources of provider that need converting, adding every file name to seen"""
+        for source in provider.sources():
+            if source.filename in seen:
+                self.log(f"Skipping {source.name}: another {source.filename} was already converted", "WARN")
+                self.stats["skipped"] += 1
+                continue
+            seen.add(source.filename)
+            
+            if self.is_unchanged(source.name, source.data):
+                self.log(f"Unchanged: {source.filename}", "DEBUG")
+                self.stats["unchanged"] += 1
+            else:
+                yield source
     
-    def process_directory(self, directory, specific_file=None):
-        """Process JavaScript files in the directory"""
+    def convert_sources(self, sources):
+        """Convert in-memory sources, in bounded batches when using worker processes"""
+        if self.jobs <= 1:
+            for source in sources:
+                self.apply_result(self.convert_file(source.name, data=source.data))
+            return
+        
+        batch_size = self.jobs * 16
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                 initargs=(self.worker_options(),)) as executor:
+            # Only one batch of script bytes is held in memory at a time
+            while True:
+                batch = list(islice(sources, batch_size))
+                if not batch:
+                    break
+                for result in executor.map(_convert_in_worker, [source.name for source in batch],
+                                           [source.data for source in batch]):
+                    self.apply_result(result)
+    
+    def process_directory(self, directory, specific_file=None, recursive=False):
+        """Process JavaScript files in the directory, returning False if any file failed
+        
+        In check mode nothing is written and False also means some output is stale.
+        recursive also converts scripts in subfolders.
+        """
         self.log(f"Starting to process directory: {directory}")
+        started = time.perf_counter()
         
         # Ensure directory exists
         if not os.path.isdir(directory):
             self.log(f"Directory does not exist: {directory}", "ERROR")
-            return
+            return False
+        
+        self.load_manifest()
+        self.load_catalog()
         
         if specific_file:
             # Process specific file
@@ -489,33 +1744,180 @@ class ScriptConverter:
                 self.process_file(specific_path)
             else:
                 self.log(f"Specified file doesn't exist or isn't a JS file: {specific_path}", "ERROR")
+                return False
         else:
-            # Process all files
-            js_files = glob(os.path.join(directory, "*.js"))
+            # Process all files in a stable order
+            js_files = iter_script_paths(directory, recursive)
+            if recursive:
+                js_files = self.unique_by_name(js_files)
             if not js_files:
                 self.log(f"No JS files found in directory: {directory}", "WARN")
-                return
             
-            for file_path in js_files:
-                self.process_file(file_path)
+            self.process_files(js_files)
+            
+            # Drop outputs of deleted sources
+            self.prune_deleted(js_files)
+            
+            self.dedup_outputs()
+        
+        return self.finish_run(started)
+    
+    def finish_run(self, started):
+        """Save build state, write the profile and log statistics, returning the run's success"""
+        self.prune_rule_sets()
+        self.save_manifest()
+        self.save_catalog()
+        
+        if self.profile_path:
+            self.write_profile_report(time.perf_counter() - started)
         
         # Output statistics
         self.log("\nConversion Statistics:")
         self.log(f"Success: {self.stats['success']}")
         self.log(f"Failed: {self.stats['failed']}")
         self.log(f"Skipped: {self.stats['skipped']}")
+        self.log(f"Unchanged: {self.stats['unchanged']}")
+        self.log(f"Pruned: {self.stats['pruned']}")
+        if self.stats["guessed_hostnames"]:
+            self.log(f"Guessed or default MITM hostnames: {self.stats['guessed_hostnames']} "
+                     "(details at DEBUG level)", "WARN")
+        if self.check:
+            self.log(f"Stale outputs: {len(self.stale)}")
+            return self.stats["failed"] == 0 and not self.stale
+        self.log(f"Written: {self.stats['written']}")
+        if self.dedup:
+            self.log(f"Deduplicated: {self.stats['deduplicated']}")
+        if self.compile_bodies:
+            self.log(f"Compiled to body rewrites: {self.stats['compiled']}")
+        if self.rule_set_min is not None:
+            self.log(f"Rule sets: {self.stats['rule_sets']}")
+        return self.stats["failed"] == 0
+
+def convert(text, targets=None, scriptname="script"):
+    """Convert QuantumultX script text to {target: module text} with default settings"""
+    return ScriptConverter().convert(text, targets, scriptname)
+
+# Per-process converter used by the worker pool
+_worker_converter = None
+
+def add_source_arguments(parser, positional=True):
+    """qx_folder, -r/--recursive and --subdir arguments of tools reading scripts through iter_script_infos"""
+    if positional:
+        parser.add_argument("qx_folder", help="folder of QuantumultX scripts, a .tar[.gz|.bz2|.xz] or .zip archive, "
+                                              "or git:REPO@REF[..REF]")
+    parser.add_argument("-r", "--recursive", action="store_true", help="also read scripts in subfolders")
+    parser.add_argument("--subdir", default="", help="only read scripts below this path of a folder or git tree")
+
+def write_json_report(report, output=None):
+    """Write a tool's JSON report to output, or to stdout when no output is given"""
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+def _init_worker(options):
+    """Build the converter a worker process uses for all its files"""
+    global _worker_converter
+    _worker_converter = ScriptConverter()
+    for key, value in options.items():
+        setattr(_worker_converter, key, value)
+
+def _convert_in_worker(file_path, data=None):
+    """Convert one file in a worker, returning its buffered log lines with the result"""
+    _worker_converter.log_records = []
+    result = _worker_converter.convert_file(file_path, data=data)
+    result["logs"] = _worker_converter.log_records
+    _worker_converter.log_records = None
+    return result
 
 def main():
     """Main function"""
-    if len(sys.argv) < 2:
-        print("Usage: python script_converter.py <qx_folder> [specific_file]")
-        sys.exit(1)
-    
-    qx_folder = sys.argv[1]
-    specific_file = sys.argv[2] if len(sys.argv) > 2 else None
+    parser = argparse.ArgumentParser(description="Convert QuantumultX scripts to Loon plugins and Surge modules")
+    parser.add_argument("qx_folder",
+                        help="folder containing QuantumultX scripts, a .tar[.gz|.bz2|.xz] or .zip archive, "
+                             "or git:REPO@REF (git:REPO@BASE..REF for only the scripts changed since BASE)")
+    parser.add_argument("specific_file", nargs="?", help="only convert this file from the folder")
+    parser.add_argument("-r", "--recursive", action="store_true", help="also convert scripts in subfolders")
+    parser.add_argument("--subdir", default="", help="only read scripts below this path of a git tree")
+    parser.add_argument("--force", action="store_true", help="ignore the build manifest and reconvert every file")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--targets", default=",".join(EMITTERS),
+                        help=f"comma separated output targets (default: {','.join(EMITTERS)})")
+    parser.add_argument("--check", action="store_true",
+                        help="write nothing, exit non-zero if any output is out of date")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and reconvert scripts whenever they change")
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="seconds between polls in watch mode (default: 0.5)")
+    parser.add_argument("--dedup-outputs", choices=DEDUP_MODES,
+                        help="hardlink byte-identical outputs together, or list them in "
+                             f"{OUTPUT_DEDUP_FILE} (manifest)")
+    parser.add_argument("--compile-body-rewrites", action="store_true",
+                        help="emit response-body scripts that only replace text or JSON fields as native "
+                             "Surge [Body Rewrite] / Loon [Rewrite] rules instead of scripts")
+    parser.add_argument("--rule-sets", action="store_true",
+                        help=f"move long runs of same-policy rules into shared {RULE_SET_DIRECTORY}/*{RULE_SET_EXTENSION} "
+                             "files referenced through RULE-SET")
+    parser.add_argument("--rule-set-min", type=int, default=DEFAULT_MIN_RULES,
+                        help=f"fewest consecutive rules moved into a rule set (default: {DEFAULT_MIN_RULES})")
+    parser.add_argument("--rule-set-url",
+                        help="URL the rule-set folder is published under (default: the repository's raw GitHub URL)")
+    parser.add_argument("--profile", metavar="REPORT",
+                        help="record per-stage timings of every converted file into a JSON report")
+    parser.add_argument("--profile-top", type=int, default=10,
+                        help="number of slowest files listed in the profile report (default: 10)")
+    parser.add_argument("--output-root", default="",
+                        help="directory the Loon/Surge/... output folders go in (default: current directory)")
+    parser.add_argument("--catalog", metavar="JSON",
+                        help="maintain a catalog of the converted modules in this JSON file")
+    parser.add_argument("--catalog-sqlite", metavar="DB",
+                        help="also mirror the catalog into this SQLite database (needs --catalog)")
+    parser.add_argument("--manifest",
+                        help=f"build manifest path (default: {MANIFEST_FILE} in the output root)")
+    args = parser.parse_args()
     
     converter = ScriptConverter()
-    converter.process_directory(qx_folder, specific_file)
+    converter.force = args.force
+    converter.output_root = args.output_root
+    converter.manifest_path = args.manifest or os.path.join(args.output_root, MANIFEST_FILE)
+    converter.jobs = max(1, args.jobs)
+    converter.check = args.check
+    converter.dedup = args.dedup_outputs
+    converter.compile_bodies = args.compile_body_rewrites
+    if args.rule_sets:
+        converter.rule_set_min = max(1, args.rule_set_min)
+        converter.rule_set_url = args.rule_set_url
+    if args.catalog_sqlite and not args.catalog:
+        parser.error("--catalog-sqlite needs --catalog")
+    converter.catalog_path = args.catalog
+    converter.catalog_sqlite = args.catalog_sqlite
+    converter.profile = bool(args.profile)
+    converter.profile_path = args.profile
+    converter.profile_top = args.profile_top
+    converter.targets = [target.strip().lower() for target in args.targets.split(',') if target.strip()]
+    unknown = [target for target in converter.targets if target not in EMITTERS]
+    if unknown:
+        parser.error(f"unknown target(s): {', '.join(unknown)}")
+    if not os.path.isdir(args.qx_folder) and not args.watch:
+        if args.specific_file:
+            parser.error("a specific file can only be given for a folder")
+        try:
+            provider = open_provider(args.qx_folder, subdir=args.subdir)
+        except ProviderError as e:
+            parser.error(str(e))
+        if not converter.process_sources(provider):
+            sys.exit(1)
+    elif args.watch:
+        if args.check or args.specific_file or args.recursive:
+            parser.error("--watch cannot be combined with --check, --recursive or a specific file")
+        if not converter.watch_directory(args.qx_folder, interval=args.interval):
+            sys.exit(1)
+    elif not converter.process_directory(args.qx_folder, args.specific_file, args.recursive):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()